@@ -5,14 +5,21 @@ Object Counter class.
 # pylint: disable=missing-class-docstring,missing-function-docstring,invalid-name
 
 import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import cv2
-from joblib import Parallel, delayed
 
-from tracker import add_new_blobs, remove_duplicates, update_blob_tracker
+import settings
+from tracker import add_new_blobs, remove_duplicates, update_blob_tracker, move_boxes
 from detectors.detector import get_bounding_boxes
-from util.detection_roi import get_roi_frame, draw_roi
+from util.detection_roi import get_roi_frame, get_roi_bounds, draw_roi
+from util.image import StaticOverlay
 from util.logger import get_logger
-from counter import attempt_count
+from util.worker_pool import WorkerPool
+from util.scheduler import DetectionScheduler
+from util.kalman import KalmanBank
+from util.motion import MotionGate
+from progress import get_ProgressCounter
+from counter import attempt_count_batch, get_cross_mode_lines
 import numpy as np
 
 logger = get_logger()
@@ -23,12 +30,16 @@ ccw_rot=np.array([[0,1],[-1,0]])
 
 class ObjectCounter():
 
-	def __init__(self, initial_frame, detector, tracker, droi, show_droi, mcdf, mctf, di, counting_lines, show_counts, hud_color):
+	def __init__(self, initial_frame, detector, tracker, droi, show_droi, mcdf, mctf, di, counting_lines, show_counts, hud_color,
+				 tracker_threads=NUM_CORES, tracker_parallel_min_blobs=8, droi_crop=False, detection_cache=None, progress=None,
+				 trajectory_writer=None, detection_queue=None, async_detection=False, adaptive_di_bounds=None,
+				 motion_gate=None, tracker_reinit_overlap=None, tracking_scale=1.0, tracking_grayscale=False):
 		self.frame = initial_frame # current frame of video
 		self.detector = detector
 		self.tracker = tracker
 		self.droi = droi # detection region of interest
 		self.show_droi = show_droi
+		self.droi_crop = droi_crop # run detection on the bounding rectangle of the droi only
 		self.mcdf = mcdf # maximum consecutive detection failures
 		self.mctf = mctf # maximum consecutive tracking failures
 		self.detection_interval = di
@@ -37,69 +48,222 @@ class ObjectCounter():
 		self.f_height, self.f_width, _ = self.frame.shape
 		self.frame_count = 0 # number of frames since last detection
 		self.counts = {counting_line['label']: {} for counting_line in counting_lines} # counts of objects by type for each counting line
+		self.count_events = [] # objects counted, in the order they were counted
 		self.show_counts = show_counts
 		self.hud_color = hud_color
+		self.counting_lines_overlay = None # counting lines rendered by the first call to visualize
+		# trackers are updated serially when there are fewer than tracker_parallel_min_blobs blobs
+		self.tracker_pool = WorkerPool(tracker_threads, tracker_parallel_min_blobs)
+		self.stats = {'detections': 0, 'duplicates_removed': 0, 'tracker_reinits': 0, 'tracker_reinits_skipped': 0}
+		self.detection_cache = detection_cache # detector outputs of previous runs on the same video
+		self.progress = progress if progress is not None else get_ProgressCounter()
+		self.trajectory_writer = trajectory_writer # records blob positions for offline recounts
+		self.detection_queue = detection_queue # detector shared with other streams, if any
+		# in async mode, detection runs on a worker thread while trackers keep processing frames
+		self.detection_executor = ThreadPoolExecutor(max_workers=1) if async_detection else None
+		self.pending_detection = None # (future, blob bounding boxes, frame number) of the running detection
+		if async_detection:
+			self.stats.update({'async_detections': 0, 'async_detection_lag': 0})
+		# with adaptive_di_bounds = (minimum, maximum), the detection interval follows the activity of the scene
+		self.detection_scheduler = None
+		if adaptive_di_bounds is not None:
+			self.detection_scheduler = DetectionScheduler(get_roi_bounds(self.droi, self.frame.shape), di, *adaptive_di_bounds)
+			self.detection_interval = self.detection_scheduler.interval
+		self.motion_gate = motion_gate # skips detection on static scenes
+		self.tracker_bank = KalmanBank() if tracker == 'sort' else None # filters of all 'sort' trackers
+		# trackers of matched blobs are kept when they still overlap the detections this much
+		self.tracker_reinit_overlap = tracker_reinit_overlap
+		# trackers can run on downscaled and/or grayscale frames, computed once per frame
+		self.tracking_scale = tracking_scale
+		self.tracking_grayscale = tracking_grayscale
+		self.resize_tracking_frame = tracker != 'sort' and (tracking_scale != 1.0 or tracking_grayscale)
+		self.tracking_frame = self.get_tracking_frame(self.frame)
+		self.tracker_updates = 0 # tracker updates since last detection
+		self.tracking_failures = 0 # failed tracker updates since last detection
 
 		# create blobs from initial frame
-		droi_frame = get_roi_frame(self.frame, self.droi)
-		_bounding_boxes, _classes, _confidences = get_bounding_boxes(droi_frame, self.detector)
-		self.blobs = add_new_blobs(_bounding_boxes, _classes, _confidences, self.blobs, self.frame, self.tracker, self.mcdf)
+		_bounding_boxes, _classes, _confidences = self.detect(self.get_droi_frame(self.frame))
+		self.blobs = add_new_blobs(_bounding_boxes, _classes, _confidences, self.blobs, self.frame, self.tracker, self.mcdf,
+								   tracker_bank=self.tracker_bank, tracking_frame=self.tracking_frame,
+								   tracking_scale=self.tracking_scale)
 
 	def get_counts(self):
 		return self.counts
 
+	def get_count_events(self):
+		return self.count_events
+
 	def get_blobs(self):
 		return self.blobs
 
-	def count(self, frame):
+	def get_stats(self):
+		stats = dict(self.stats, tracker_pool=self.tracker_pool.get_stats())
+		if self.detection_cache is not None:
+			stats['detection_cache'] = self.detection_cache.get_stats()
+		if self.motion_gate is not None:
+			stats['motion_gate'] = self.motion_gate.get_stats()
+		return stats
+
+	def get_droi_frame(self, frame):
+		'''
+		Prepare the frame passed to the detector.
+		'''
+		return get_roi_frame(frame, self.droi, self.droi_crop)
+
+	def get_tracking_frame(self, frame):
+		'''
+		Prepare the frame passed to the trackers.
+		Return None if trackers use frames as they are.
+		'''
+		if not self.resize_tracking_frame:
+			return None
+		if self.tracking_scale != 1.0:
+			frame = cv2.resize(frame, None, fx=self.tracking_scale, fy=self.tracking_scale, interpolation=cv2.INTER_AREA)
+		if self.tracking_grayscale:
+			frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+			if self.tracker == 'kcf':
+				# KCF trackers fail to update on single channel frames, they get the gray levels on 3 channels
+				frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+		return frame
+
+	def detect(self, droi_frame, frame_number=None):
+		'''
+		Run detection on a frame prepared by get_droi_frame.
+		frame_number defaults to the current frame.
+		Bounding boxes are returned in frame coordinates.
+		'''
+		if frame_number is None:
+			frame_number = self.progress.frame()
+		if self.detection_cache is not None:
+			detections = self.detection_cache.get(frame_number)
+			if detections is not None:
+				return detections
+
+		if self.detection_queue is not None:
+			_bounding_boxes, _classes, _confidences = self.detection_queue.detect(droi_frame)
+		else:
+			_bounding_boxes, _classes, _confidences = get_bounding_boxes(droi_frame, self.detector)
+		if self.droi_crop:
+			x, y, _, _ = get_roi_bounds(self.droi, self.frame.shape)
+			_bounding_boxes = [[box[0] + x, box[1] + y, box[2], box[3]] for box in _bounding_boxes]
+
+		if self.detection_cache is not None:
+			self.detection_cache.put(frame_number, _bounding_boxes, _classes, _confidences)
+		return _bounding_boxes, _classes, _confidences
+
+	def close(self):
+		if self.detection_executor is not None:
+			if self.pending_detection is not None:
+				# its result is no longer needed, drop it if it hasn't started yet
+				self.pending_detection[0].cancel()
+			self.detection_executor.shutdown(wait=True)
+		self.tracker_pool.shutdown()
+
+	def _add_detections(self, _bounding_boxes, _classes, _confidences):
+		old_blob_ids = set(self.blobs)
+		self.blobs = add_new_blobs(_bounding_boxes, _classes, _confidences, self.blobs, self.frame, self.tracker, self.mcdf,
+								   tracker_bank=self.tracker_bank, reinit_overlap=self.tracker_reinit_overlap, stats=self.stats,
+								   tracking_frame=self.tracking_frame, tracking_scale=self.tracking_scale)
+		num_blobs = len(self.blobs)
+		self.blobs = remove_duplicates(self.blobs)
+		self.stats['duplicates_removed'] += num_blobs - len(self.blobs)
+		if self.tracker_bank is not None:
+			self.tracker_bank.release_unused([blob.tracker.slot for blob in self.blobs.values()])
+		self.stats['detections'] += 1
+
+		if self.detection_scheduler is not None:
+			num_new_blobs = len(set(self.blobs) - old_blob_ids)
+			tracking_failure_rate = self.tracking_failures / self.tracker_updates if self.tracker_updates else 0.0
+			self.detection_interval = self.detection_scheduler.update(
+				[blob.bounding_box for blob in self.blobs.values()], num_new_blobs, tracking_failure_rate
+			)
+		self.tracker_updates = 0
+		self.tracking_failures = 0
+
+	def _add_async_detections(self):
+		'''
+		Add the detections of an earlier frame, moved along with the blobs they overlap.
+		'''
+		future, old_bboxes, frame_number = self.pending_detection
+		self.pending_detection = None
+		_bounding_boxes, _classes, _confidences = future.result()
+		# blobs can only have been removed since the detection started
+		blob_ids = [blob_id for blob_id in old_bboxes if blob_id in self.blobs]
+		_bounding_boxes = move_boxes(_bounding_boxes, [old_bboxes[blob_id] for blob_id in blob_ids],
+									 [self.blobs[blob_id].bounding_box for blob_id in blob_ids])
+		self._add_detections(_bounding_boxes, _classes, _confidences)
+		self.stats['async_detections'] += 1
+		self.stats['async_detection_lag'] += self.progress.frame() - frame_number
+
+	def count(self, frame, droi_frame=None):
+		'''
+		Update trackers with a new frame and rerun detection when due.
+		droi_frame is the detection ROI of frame if it has already been computed (e.g. while prefetching).
+		'''
 		self.frame = frame
+		self.tracking_frame = self.get_tracking_frame(frame)
 
 		blobs_list = list(self.blobs.items())
 		# update blob trackers
-		blobs_list = Parallel(n_jobs=NUM_CORES, prefer='threads')(
-			delayed(update_blob_tracker)(blob, blob_id, self.frame) for blob_id, blob in blobs_list
-		)
+		if self.tracker_bank is not None:
+			# all Kalman filters are moved forward at once
+			self.tracker_bank.predict()
+			bounding_boxes = self.tracker_bank.get_boxes([blob.tracker.slot for _, blob in blobs_list]).tolist()
+			for (_, blob), bounding_box in zip(blobs_list, bounding_boxes):
+				blob.update(bounding_box)
+		else:
+			tracking_frame, tracking_scale = (self.tracking_frame, self.tracking_scale) \
+				if self.tracking_frame is not None else (self.frame, 1.0)
+			blobs_list = self.tracker_pool.map(
+				lambda item: update_blob_tracker(item[1], item[0], tracking_frame, tracking_scale), blobs_list
+			)
 		self.blobs = dict(blobs_list)
+		self.tracker_updates += len(blobs_list)
+		self.tracking_failures += sum(1 for _, blob in blobs_list if blob.num_consecutive_tracking_failures > 0)
 
-		for blob_id, blob in blobs_list:
-			# count object if it has crossed a counting line
-			blob, self.counts = attempt_count(blob, blob_id, self.counting_lines, self.counts)
-			self.blobs[blob_id] = blob
+		if self.trajectory_writer is not None:
+			self.trajectory_writer.add(self.progress.frame(), self.blobs)
+
+		# count objects that have crossed a counting line
+		self.blobs, self.counts = attempt_count_batch(self.blobs, self.counting_lines, self.counts, self.count_events,
+													   self.progress.frame())
 
+		for blob_id, blob in blobs_list:
 			# remove blob if it has reached the limit for tracking failures
 			if blob.num_consecutive_tracking_failures >= self.mctf:
 				del self.blobs[blob_id]
 
-		if self.frame_count >= self.detection_interval:
-			# rerun detection
-			droi_frame = get_roi_frame(self.frame, self.droi)
-			_bounding_boxes, _classes, _confidences = get_bounding_boxes(droi_frame, self.detector)
+		if self.pending_detection is not None and self.pending_detection[0].done():
+			self._add_async_detections()
 
-			self.blobs = add_new_blobs(_bounding_boxes, _classes, _confidences, self.blobs, self.frame, self.tracker, self.mcdf)
-			self.blobs = remove_duplicates(self.blobs)
+		if self.frame_count >= self.detection_interval and self.pending_detection is None:
+			if self.motion_gate is not None and not self.motion_gate.should_detect(self.frame, len(self.blobs) > 0):
+				# nothing moves and nothing is tracked, postpone detection to the next interval
+				logger.debug('Detection skipped.', extra={
+					'meta': {'label': 'DETECTION_SKIP', 'frame': self.progress.frame(), 'skips': self.motion_gate.skips},
+				})
+			else:
+				# rerun detection
+				if droi_frame is None:
+					droi_frame = self.get_droi_frame(self.frame)
+				if self.detection_executor is not None:
+					frame_number = self.progress.frame()
+					future = self.detection_executor.submit(self.detect, droi_frame, frame_number)
+					old_bboxes = {blob_id: blob.bounding_box for blob_id, blob in self.blobs.items()}
+					self.pending_detection = (future, old_bboxes, frame_number)
+				else:
+					self._add_detections(*self.detect(droi_frame))
 			self.frame_count = 0
 
 		self.frame_count += 1
 
-	def visualize(self):
-		frame = self.frame
+	def _draw_counting_lines(self, frame, color):
 		font = cv2.FONT_HERSHEY_DUPLEX
 		line_type = cv2.LINE_AA
-
-		# draw and label blob bounding boxes
-		for _id, blob in self.blobs.items():
-			(x, y, w, h) = [int(v) for v in blob.bounding_box]
-			cv2.rectangle(frame, (x, y), (x + w, y + h), self.hud_color, 2)
-			object_label = 'I: ' + _id[:8] \
-							if blob.type is None \
-							else 'I: {0}, T: {1} ({2})'.format(_id[:8], blob.type, str(blob.type_confidence)[:4])
-			cv2.putText(frame, object_label, (x, y - 5), font, 1, self.hud_color, 2, line_type)
-
-		# draw counting lines
 		for counting_line in self.counting_lines:	
 			p0=counting_line['line'][0]
 			p1=counting_line['line'][1]
-			cv2.line(frame, p0,p1, self.hud_color, 3)
+			cv2.line(frame, p0,p1, color, 3)
 			direction=counting_line.get('direction',None)
 			if direction=='left' or direction=='right':
 				p0_=np.array(p0)
@@ -109,10 +273,29 @@ class ObjectCounter():
 				else:
 					pd_=(p0_+p1_)/2-ccw_rot.dot((p1_-p0_)/10)
 				pd=(int(pd_[0]),int(pd_[1]))
-				cv2.line(frame, p0, pd, self.hud_color, 1)
-				cv2.line(frame, p1, pd, self.hud_color, 1)
+				cv2.line(frame, p0, pd, color, 1)
+				cv2.line(frame, p1, pd, color, 1)
 			cl_label_origin = (counting_line['line'][0][0], counting_line['line'][0][1] + 35)
-			cv2.putText(frame, counting_line['label'], cl_label_origin, font, 1, self.hud_color, 2, line_type)
+			cv2.putText(frame, counting_line['label'], cl_label_origin, font, 1, color, 2, line_type)
+
+	def visualize(self):
+		frame = self.frame
+		font = cv2.FONT_HERSHEY_DUPLEX
+		line_type = cv2.LINE_AA
+
+		# draw and label blob bounding boxes
+		for _id, blob in self.blobs.items():
+			(x, y, w, h) = [int(v) for v in blob.bounding_box]
+			cv2.rectangle(frame, (x, y), (x + w, y + h), self.hud_color, 2)
+			object_label = 'I: ' + _id[:8] \
+							if blob.type is None \
+							else 'I: {0}, T: {1} ({2})'.format(_id[:8], blob.type, str(blob.type_confidence)[:4])
+			cv2.putText(frame, object_label, (x, y - 5), font, 1, self.hud_color, 2, line_type)
+
+		# draw counting lines, they are rendered once since they don't move
+		if self.counting_lines_overlay is None:
+			self.counting_lines_overlay = StaticOverlay(frame.shape, self.hud_color, self._draw_counting_lines)
+		self.counting_lines_overlay.apply(frame)
 
 		# show detection roi
 		if self.show_droi:
@@ -129,3 +312,28 @@ class ObjectCounter():
 				offset += 2
 
 		return frame
+
+
+def build_object_counter(frame, config, droi, counting_lines, tracker_threads, **kwargs):
+	'''
+	Create the object counter of a video from its first frame.
+	config holds the stream settings TRACKER, DI, MCDF and MCTF, other settings are read from the configuration file.
+	droi and counting_lines are in the coordinates of frame, counting lines are switched to cross mode
+	when frames are skipped (FRAME_STRIDE > 1).
+	Other keyword arguments (detection_cache, trajectory_writer, progress, detection_queue) are passed to ObjectCounter.
+	'''
+	if settings.FRAME_STRIDE > 1:
+		counting_lines = get_cross_mode_lines(counting_lines)
+	motion_gate = None
+	if settings.MOTION_GATE != 'none':
+		motion_gate = MotionGate(settings.MOTION_GATE, droi, frame.shape, settings.MOTION_GATE_THRESHOLD, settings.MOTION_GATE_MAX_SKIPS)
+	return ObjectCounter(frame, settings.DETECTOR, config['TRACKER'], droi, settings.SHOW_DROI,
+						 config['MCDF'], config['MCTF'], config['DI'], counting_lines,
+						 settings.SHOW_COUNTS, settings.HUD_COLOR, tracker_threads,
+						 settings.TRACKER_PARALLEL_MIN_BLOBS, settings.DROI_CROP,
+						 async_detection=settings.ASYNC_DETECTION,
+						 adaptive_di_bounds=(settings.DI_MIN, settings.DI_MAX) if settings.ADAPTIVE_DI else None,
+						 motion_gate=motion_gate,
+						 tracker_reinit_overlap=settings.TRACKER_REINIT_OVERLAP if settings.LAZY_TRACKER_REINIT else None,
+						 tracking_scale=settings.TRACKING_SCALE, tracking_grayscale=settings.TRACKING_GRAYSCALE,
+						 **kwargs)
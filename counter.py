@@ -38,6 +38,9 @@ progress=get_ProgressCounter()
 touch_mode=0
 cross_mode=1
 
+# 'cross' mode lookfor values replacing 'touch' mode ones when frames are skipped
+_cross_mode_lookfor={'box':'corners','left':'cc','right':'cc','top':'cc','bottom':'cc'}
+
 def test_lines(lines):
 	'''
 	Test counting lines parameters. So I can avoid some try - except later
@@ -55,6 +58,15 @@ def test_lines(lines):
 		return None		
 
 
+def get_cross_mode_lines(lines):
+	'''
+	Switch counting lines in 'touch' mode to 'cross' mode.
+	When frames are skipped objects can jump over a counting line without their bounding box ever touching it,
+	in 'cross' mode they are still counted.
+	'''
+	return [dict(line,lookfor=_cross_mode_lookfor[line.get('lookfor','box')]) if line.get('lookfor','box') in _cross_mode_lookfor else line
+			for line in lines]
+
 def _line_segments_intersect(line1, line2):
 	'''
 	See: https://www.geeksforgeeks.org/check-if-two-given-line-segments-intersect/
@@ -216,24 +228,242 @@ def attempt_count(blob, blob_id, counting_lines, counts):
 			bloblines=_get_dynamic_lines(blob.bounding_box,blob.old_bounding_box,lookfor)	
 			
 		if _has_crossed_counting_line(counting_line,bloblines,blob,mode):
-			if blob.type in counts[label]:
-				counts[label][blob.type] += 1
-			else:
-				counts[label][blob.type] = 1
-
-			blob.lines_crossed.append(label)
-
-			logger.info('Object counted.', extra={
-				'meta': {
-					'label': 'OBJECT_COUNT',
-					'id': blob_id,
-					'type': blob.type,
-					'counting_line': label,
-					'position_first_detected': blob.position_first_detected,
-					'position_counted': blob.centroid,
-					'counted_at':time.time(),
-					'counted_at_frame':progress.frame(),
-				},
-			})
+			_register_count(blob, blob_id, label, counts)
 	blob.old_bounding_box=blob.bounding_box
 	return blob, counts
+
+def _register_count(blob, blob_id, label, counts, frame_number=None):
+	'''
+	Count a blob that has crossed the counting line with the given label.
+	frame_number defaults to the frame of the progress counter.
+	'''
+	if blob.type in counts[label]:
+		counts[label][blob.type] += 1
+	else:
+		counts[label][blob.type] = 1
+
+	blob.lines_crossed.append(label)
+
+	event = {
+		'id': blob_id,
+		'type': blob.type,
+		'counting_line': label,
+		'position_first_detected': blob.position_first_detected,
+		'position_counted': blob.centroid,
+		'counted_at':time.time(),
+		'counted_at_frame':frame_number if frame_number is not None else progress.frame(),
+	}
+	logger.info('Object counted.', extra={'meta': dict(event, label='OBJECT_COUNT')})
+	return event
+
+# Batch evaluation
+# The functions below do the same job as attempt_count, but each counting line is evaluated for all blobs
+# at once using arrays. Bounding boxes are (n, 4) arrays, points and centroids are (n, 2) arrays.
+
+def _get_orientations(p, q, r):
+	'''
+	Vectorized get_orientation of _line_segments_intersect.
+	'''
+	val = (q[..., 1] - p[..., 1]) * (r[..., 0] - q[..., 0]) - (q[..., 0] - p[..., 0]) * (r[..., 1] - q[..., 1])
+	return np.sign(val)
+
+def _are_on_segments(p, q, r):
+	'''
+	Vectorized is_on_segment of _line_segments_intersect.
+	'''
+	return (q[..., 0] <= np.maximum(p[..., 0], r[..., 0])) & (q[..., 0] >= np.minimum(p[..., 0], r[..., 0])) & \
+		   (q[..., 1] <= np.maximum(p[..., 1], r[..., 1])) & (q[..., 1] >= np.minimum(p[..., 1], r[..., 1]))
+
+def _segments_intersect(line, segments):
+	'''
+	Vectorized _line_segments_intersect.
+	Check a line against an array of segments of shape (..., 2, 2).
+	Returns an array telling which segments intersect the line and the orientation o3 for each of them.
+	'''
+	p1 = np.asarray(line[0], dtype=np.float64)
+	q1 = np.asarray(line[1], dtype=np.float64)
+	p2 = segments[..., 0, :]
+	q2 = segments[..., 1, :]
+
+	o1 = _get_orientations(p1, q1, p2)
+	o2 = _get_orientations(p1, q1, q2)
+	o3 = _get_orientations(p2, q2, p1)
+	o4 = _get_orientations(p2, q2, q1)
+
+	intersect = ((o1 != o2) & (o3 != o4)) | \
+				((o1 == 0) & _are_on_segments(p1, p2, q1)) | \
+				((o2 == 0) & _are_on_segments(p1, q2, q1)) | \
+				((o3 == 0) & _are_on_segments(p2, p1, q2)) | \
+				((o4 == 0) & _are_on_segments(p2, q1, q2))
+	return intersect, np.where(intersect, o3, 0)
+
+def _get_centroids(bboxes):
+	'''
+	Vectorized get_centroid.
+	'''
+	return np.round((bboxes[:, :2] + bboxes[:, :2] + bboxes[:, 2:]) / 2)
+
+def _get_blob_segments(bboxes, old_bboxes, lookfor):
+	'''
+	Vectorized _get_static_lines and _get_dynamic_lines.
+	Returns an array of segments of shape (n, number of segments per blob, 2, 2).
+	'''
+	x, y, w, h = bboxes.T
+	ox, oy, ow, oh = old_bboxes.T
+	points = {
+		# 'touch' mode, edges of the bounding box
+		'top': ((x, y), (x + w, y)),
+		'right': ((x + w, y), (x + w, y + h)),
+		'left': ((x, y), (x, y + h)),
+		'bottom': ((x, y + h), (x + w, y + h)),
+		# 'cross' mode, movement of points of the bounding box
+		'tl': ((ox, oy), (x, y)),
+		'tr': ((ox + ow, oy), (x + w, y)),
+		'bl': ((ox, oy + oh), (x, y + h)),
+		'br': ((ox + ow, oy + oh), (x + w, y + h)),
+	}
+	if lookfor == 'cc':
+		return np.stack([_get_centroids(old_bboxes), _get_centroids(bboxes)], axis=1)[:, np.newaxis]
+	if lookfor == 'box':
+		what = ['top', 'right', 'left', 'bottom']
+	elif lookfor == 'corners':
+		what = ['tl', 'tr', 'bl', 'br']
+	else:
+		what = [lookfor]
+	# (segments, start/end, x/y, n) -> (n, segments, start/end, x/y)
+	return np.array([points[w] for w in what], dtype=np.float64).transpose(3, 0, 1, 2)
+
+def get_crossings(counting_line, bboxes, old_bboxes, has_old_bbox, first_positions):
+	'''
+	Check which blobs have crossed a counting line, ignoring the lines they have already crossed.
+	has_old_bbox tells for which blobs old_bboxes holds a previous bounding box different from the current one.
+	first_positions are the positions where blobs were first detected.
+	Returns a boolean array with an item for each blob.
+	'''
+	bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+	old_bboxes = np.asarray(old_bboxes, dtype=np.float64).reshape(-1, 4)
+	first_positions = np.asarray(first_positions, dtype=np.float64).reshape(-1, 2)
+	centroids = _get_centroids(bboxes)
+	eligible = np.ones(len(bboxes), dtype=bool)
+
+	if 'mindist' in counting_line:
+		mindist = counting_line['mindist']
+		dist2 = ((centroids - first_positions) ** 2).sum(axis=1)
+		eligible &= ~(dist2 < mindist * mindist)
+
+	direction = counting_line.get('direction', None)
+	lookfor = counting_line.get('lookfor', 'box')
+	mode = touch_mode if lookfor in ['top', 'right', 'left', 'bottom', 'box'] else cross_mode
+	# blobs without a previous bounding box are skipped if it is needed
+	if direction is not None or mode == cross_mode:
+		eligible &= has_old_bbox
+
+	cline = counting_line['line']
+	intersect, orientations = _segments_intersect(cline, _get_blob_segments(bboxes, old_bboxes, lookfor))
+	crossed = eligible & intersect.any(axis=1)
+	if direction is None:
+		return crossed
+
+	dirv = 1 if direction == 'left' else -1
+	if counting_line.get('dir_measurement', None) == 'previous':
+		if mode == cross_mode:
+			# orientation of the first blob segment crossing the counting line
+			first_crossing = orientations[np.arange(len(bboxes)), intersect.argmax(axis=1)]
+			return crossed & (dirv * first_crossing > 0)
+		dir_start = _get_centroids(old_bboxes)
+	else: # dir_measurement=='first'
+		dir_start = first_positions
+	dirv1 = centroids - dir_start
+	dirv2 = np.subtract(cline[1], cline[0], dtype=np.float64)
+	crossprod = dirv1[:, 0] * dirv2[1] - dirv1[:, 1] * dirv2[0]
+	return crossed & (crossprod * dirv > 0)
+
+def attempt_count_batch(blobs, counting_lines, counts, events=None, frame_number=None):
+	'''
+	Check if blobs have crossed a counting line.
+	This gives the same results as calling attempt_count for each blob,
+	but each counting line is checked for all blobs at once.
+	Count events are appended to events, if given.
+	frame_number is the number of the current frame, by default the frame of the progress counter.
+	'''
+	if not blobs:
+		return blobs, counts
+
+	blob_ids = list(blobs.keys())
+	blobs_list = list(blobs.values())
+	bboxes = np.array([blob.bounding_box for blob in blobs_list], dtype=np.float64)
+	has_old_bbox = np.array([not (blob.old_bounding_box is None or blob.old_bounding_box==blob.bounding_box)
+							 for blob in blobs_list])
+	old_bboxes = np.array([blob.old_bounding_box if has_old else blob.bounding_box
+						   for blob, has_old in zip(blobs_list, has_old_bbox)], dtype=np.float64)
+	first_positions = np.array([blob.position_first_detected for blob in blobs_list], dtype=np.float64)
+
+	crossings = np.zeros((len(blobs_list), len(counting_lines)), dtype=bool)
+	for l, counting_line in enumerate(counting_lines):
+		label = counting_line['label']
+		not_crossed = np.array([label not in blob.lines_crossed for blob in blobs_list])
+		if not not_crossed.any():
+			continue
+		crossings[:, l] = not_crossed & get_crossings(counting_line, bboxes, old_bboxes, has_old_bbox, first_positions)
+
+	# register counts blob by blob, in the same order as attempt_count
+	for i, l in zip(*np.nonzero(crossings)):
+		label = counting_lines[l]['label']
+		if label not in blobs_list[i].lines_crossed:
+			event = _register_count(blobs_list[i], blob_ids[i], label, counts, frame_number)
+			if events is not None:
+				events.append(event)
+
+	for blob in blobs_list:
+		blob.old_bounding_box=blob.bounding_box
+	return blobs, counts
+
+def recount(trajectories, counting_lines):
+	'''
+	Count objects again from trajectories recorded during processing (see util.trajectory),
+	using a different set of counting lines. Counts are the same attempt_count would have given.
+	Returns the counts and the list of count events, in the order they would have been registered.
+	'''
+	frames = trajectories['frames']
+	objects = trajectories['objects']
+	bboxes = np.asarray(trajectories['boxes'], dtype=np.float64).reshape(-1, 4)
+	num_rows = len(frames)
+
+	# the old bounding box of a blob is its bounding box in the previous row recorded for it
+	order = np.lexsort((np.arange(num_rows), objects))
+	previous_rows = np.full(num_rows, -1)
+	same_object = objects[order[1:]] == objects[order[:-1]]
+	previous_rows[order[1:][same_object]] = order[:-1][same_object]
+	has_previous = previous_rows >= 0
+	old_bboxes = np.where(has_previous[:, np.newaxis], bboxes[previous_rows], bboxes)
+	has_old_bbox = has_previous & np.any(old_bboxes != bboxes, axis=1)
+	first_positions = np.asarray(trajectories['first_positions'], dtype=np.float64).reshape(-1, 2)[objects]
+
+	counts = {counting_line['label']: {} for counting_line in counting_lines}
+	events = []
+	for label_index, label in enumerate(counts):
+		crossed = np.zeros(num_rows, dtype=bool)
+		for counting_line in counting_lines:
+			if counting_line['label'] == label:
+				crossed |= get_crossings(counting_line, bboxes, old_bboxes, has_old_bbox, first_positions)
+		# an object is counted once per label, the first time it crosses
+		rows = np.flatnonzero(crossed)
+		_, first_crossings = np.unique(objects[rows], return_index=True)
+		events.extend((row, label_index, label) for row in rows[first_crossings].tolist())
+	events.sort()
+
+	type_names = trajectories['type_names'].tolist()
+	object_ids = trajectories['object_ids'].tolist()
+	count_events = []
+	for row, _, label in events:
+		_type = type_names[trajectories['types'][row]] if trajectories['types'][row] >= 0 else None
+		counts[label][_type] = counts[label].get(_type, 0) + 1
+		count_events.append({
+			'id': object_ids[objects[row]],
+			'type': _type,
+			'counting_line': label,
+			'position_first_detected': tuple(int(v) for v in first_positions[row]),
+			'position_counted': get_centroid(bboxes[row].tolist()),
+			'counted_at_frame': int(frames[row]),
+		})
+	return counts, count_events
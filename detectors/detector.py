@@ -5,27 +5,101 @@ Detectors entry point.
 # pylint: disable=import-outside-toplevel
 
 import sys
+import time
+import threading
+import settings
 from util.logger import get_logger
 
 
 logger = get_logger()
 
-def get_bounding_boxes(frame, model):
+# detectors are loaded once, on first use, and kept for the rest of the run
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+# prefix of the settings of each detector
+_SETTINGS_PREFIXES = {
+    'yolo': 'YOLO_',
+    'haarcascade': 'HAAR_',
+    'tfoda': 'TFODA_',
+    'detectron2': 'DETECTRON2_',
+}
+
+def get_detector_config(model):
     '''
-    Run object detection algorithm and return a list of bounding boxes and other metadata.
+    Fetch the settings of a detector (model paths, thresholds, ...).
+    '''
+    prefix = _SETTINGS_PREFIXES.get(model)
+    if prefix is None:
+        return {}
+    return {name: value for name, value in vars(settings).items() if name.startswith(prefix)}
+
+def _load_detector(model):
+    '''
+    Import the module implementing a detector and create the detector.
     '''
     if model == 'yolo':
-        from detectors.yolo import get_bounding_boxes as gbb
+        from detectors import yolo as backend
     elif model == 'haarcascade':
-        from detectors.haarcascade import get_bounding_boxes as gbb
+        from detectors import haarcascade as backend
     elif model == 'tfoda':
-        from detectors.tfoda import get_bounding_boxes as gbb
+        from detectors import tfoda as backend
     elif model == 'detectron2':
-        from detectors.detectron2 import get_bounding_boxes as gbb
+        from detectors import detectron2 as backend
     else:
         logger.error('Invalid detector model, algorithm or API specified (options: yolo, tfoda, detectron2, haarcascade)', extra={
             'meta': {'label': 'INVALID_DETECTION_ALGORITHM'},
         })
         sys.exit()
 
-    return gbb(frame)
+    start = time.perf_counter()
+    detector = backend.Detector()
+    detector.load_time = time.perf_counter() - start
+    detector.warmup_time = 0.0
+    return detector
+
+def get_detector(model):
+    '''
+    Fetch a detector, loading it if it's the first time it's used.
+    '''
+    detector = _detectors.get(model)
+    if detector is None:
+        with _detectors_lock:
+            if model not in _detectors:
+                _detectors[model] = _load_detector(model)
+            detector = _detectors[model]
+    return detector
+
+def load_detector(model, warmup_frame=None, warmup_runs=0):
+    '''
+    Load a detector and run warmup_runs inferences on warmup_frame,
+    so that the first frames of a video are not slowed down by lazy initializations.
+    Return the load and warm-up times in seconds.
+    '''
+    detector = get_detector(model)
+    if warmup_frame is not None and warmup_runs > 0:
+        start = time.perf_counter()
+        for _ in range(warmup_runs):
+            detector.get_bounding_boxes(warmup_frame)
+        detector.warmup_time = time.perf_counter() - start
+
+    timings = {'load_time': round(detector.load_time, 3), 'warmup_time': round(detector.warmup_time, 3)}
+    logger.info('Detector loaded.', extra={
+        'meta': dict(timings, label='DETECTOR_LOAD', detector=model, warmup_runs=warmup_runs),
+    })
+    return timings
+
+def get_bounding_boxes(frame, model):
+    '''
+    Run object detection algorithm and return a list of bounding boxes and other metadata.
+    '''
+    return get_detector(model).get_bounding_boxes(frame)
+
+def get_bounding_boxes_batch(frames, model):
+    '''
+    Run object detection algorithm on a list of frames at once.
+    Return a list with a (bounding boxes, classes, confidences) triple for each frame.
+    '''
+    if not frames:
+        return []
+    return get_detector(model).get_bounding_boxes_batch(frames)
@@ -13,31 +13,8 @@ import settings
 from util.logger import get_logger
 
 
-setup_logger()
 logger = get_logger()
 
-with open(settings.DETECTRON2_CLASSES_PATH, 'r') as classes_file:
-    CLASSES = dict(enumerate([line.strip() for line in classes_file.readlines()]))
-with open(settings.DETECTRON2_CLASSES_OF_INTEREST_PATH, 'r') as coi_file:
-    CLASSES_OF_INTEREST = tuple([line.strip() for line in coi_file.readlines()])
-
-# initialize model with weights and config
-cfg = get_cfg()
-cfg.merge_from_file(settings.DETECTRON2_CONFIG_PATH)
-cfg.MODEL.WEIGHTS = settings.DETECTRON2_WEIGHTS_PATH
-cfg.MODEL.ROI_HEADS.NUM_CLASSES = int(settings.DETECTRON2_NUM_CLASSES)
-cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = float(settings.DETECTRON2_CONFIDENCE_THRESHOLD)
-cfg.DATALOADER.NUM_WORKERS = 2
-
-if torch.cuda.is_available():
-    logger.debug('GPU available, using GPU')
-    cfg.MODEL.DEVICE = 'cuda'
-else:
-    logger.debug('No GPU available, using CPU')
-    cfg.MODEL.DEVICE = 'cpu'
-
-predictor = DefaultPredictor(cfg)
-
 def convert_box_to_array(box):
     '''
     Detectron2 returns results as a Boxes class
@@ -58,32 +35,93 @@ def convert_box_to_array(box):
     res[3] = res[3] - res[1]
     return res
 
-def get_bounding_boxes(image):
+class Detector:
     '''
-    Return a list of bounding boxes of objects detected,
-    their classes and the confidences of the detections made.
+    Detectron2 predictor built from DETECTRON2_CONFIG_PATH and DETECTRON2_WEIGHTS_PATH.
     '''
-    try:
-        outputs = predictor(image)
-    except Exception as error:
-        logger.error(error)
-
-    _classes = []
-    _confidences = []
-    _bounding_boxes = []
-
-    for i, pred in enumerate(outputs["instances"].pred_classes):
-        class_id = int(pred)
-        _class = CLASSES[class_id]
-
-        if _class in CLASSES_OF_INTEREST:
-            _classes.append(_class)
-
-            confidence = float(outputs['instances'].scores[i])
-            _confidences.append(confidence)
-
-            _box = outputs['instances'].pred_boxes[i]
-            box_array = convert_box_to_array(_box)
-            _bounding_boxes.append(box_array)
-
-    return _bounding_boxes, _classes, _confidences
+    def __init__(self):
+        setup_logger()
+
+        with open(settings.DETECTRON2_CLASSES_PATH, 'r') as classes_file:
+            self.classes = dict(enumerate([line.strip() for line in classes_file.readlines()]))
+        with open(settings.DETECTRON2_CLASSES_OF_INTEREST_PATH, 'r') as coi_file:
+            self.classes_of_interest = tuple([line.strip() for line in coi_file.readlines()])
+
+        # initialize model with weights and config
+        cfg = get_cfg()
+        cfg.merge_from_file(settings.DETECTRON2_CONFIG_PATH)
+        cfg.MODEL.WEIGHTS = settings.DETECTRON2_WEIGHTS_PATH
+        cfg.MODEL.ROI_HEADS.NUM_CLASSES = int(settings.DETECTRON2_NUM_CLASSES)
+        cfg.MODEL.ROI_HEADS.SCORE_THRESH_TEST = float(settings.DETECTRON2_CONFIDENCE_THRESHOLD)
+        cfg.DATALOADER.NUM_WORKERS = 2
+
+        if torch.cuda.is_available():
+            logger.debug('GPU available, using GPU')
+            cfg.MODEL.DEVICE = 'cuda'
+        else:
+            logger.debug('No GPU available, using CPU')
+            cfg.MODEL.DEVICE = 'cpu'
+
+        self.predictor = DefaultPredictor(cfg)
+
+    def _decode_outputs(self, outputs):
+        '''
+        Extract bounding boxes, classes and confidences of objects of interest from the predictions for one image.
+        '''
+        _classes = []
+        _confidences = []
+        _bounding_boxes = []
+
+        for i, pred in enumerate(outputs["instances"].pred_classes):
+            class_id = int(pred)
+            _class = self.classes[class_id]
+
+            if _class in self.classes_of_interest:
+                _classes.append(_class)
+
+                confidence = float(outputs['instances'].scores[i])
+                _confidences.append(confidence)
+
+                _box = outputs['instances'].pred_boxes[i]
+                box_array = convert_box_to_array(_box)
+                _bounding_boxes.append(box_array)
+
+        return _bounding_boxes, _classes, _confidences
+
+    def get_bounding_boxes(self, image):
+        '''
+        Return a list of bounding boxes of objects detected,
+        their classes and the confidences of the detections made.
+        '''
+        try:
+            outputs = self.predictor(image)
+        except Exception as error:
+            logger.error(error)
+
+        return self._decode_outputs(outputs)
+
+    def _get_model_input(self, image):
+        '''
+        Preprocess an image the same way DefaultPredictor does.
+        '''
+        if self.predictor.input_format == 'RGB':
+            image = image[:, :, ::-1]
+        height, width = image.shape[:2]
+        # older Detectron2 releases call the resize augmentation transform_gen
+        aug = self.predictor.aug if hasattr(self.predictor, 'aug') else self.predictor.transform_gen
+        image = aug.get_transform(image).apply_image(image)
+        image = torch.as_tensor(image.astype('float32').transpose(2, 0, 1))
+        return {'image': image, 'height': height, 'width': width}
+
+    def get_bounding_boxes_batch(self, images):
+        '''
+        Run detection on a list of images as a single batch.
+        Return a list with a (bounding boxes, classes, confidences) triple for each image.
+        '''
+        try:
+            with torch.no_grad():
+                batch_outputs = self.predictor.model([self._get_model_input(image) for image in images])
+        except Exception as error:
+            logger.error(error)
+
+        return [self._decode_outputs(outputs) for outputs in batch_outputs]
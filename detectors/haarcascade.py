@@ -8,8 +8,20 @@ import cv2
 import settings
 
 
-def get_bounding_boxes(frame):
-    object_cascade = cv2.CascadeClassifier(settings.HAAR_CASCADE_PATH)
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    bounding_boxes = object_cascade.detectMultiScale(gray)
-    return bounding_boxes, None, None
+class Detector:
+    '''
+    Haar cascade classifier, loaded from HAAR_CASCADE_PATH.
+    '''
+    def __init__(self):
+        self.object_cascade = cv2.CascadeClassifier(settings.HAAR_CASCADE_PATH)
+
+    def get_bounding_boxes(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        bounding_boxes = self.object_cascade.detectMultiScale(gray)
+        return bounding_boxes, None, None
+
+    def get_bounding_boxes_batch(self, frames):
+        '''
+        Run detection on each frame in turn, cascade classifiers have no batch mode.
+        '''
+        return [self.get_bounding_boxes(frame) for frame in frames]
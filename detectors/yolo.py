@@ -10,62 +10,98 @@ import numpy as np
 import settings
 
 
-with open(settings.YOLO_CLASSES_PATH, 'r') as classes_file:
-    CLASSES = dict(enumerate([line.strip() for line in classes_file.readlines()]))
-with open(settings.YOLO_CLASSES_OF_INTEREST_PATH, 'r') as coi_file:
-    CLASSES_OF_INTEREST = tuple([line.strip() for line in coi_file.readlines()])
-conf_threshold = settings.YOLO_CONFIDENCE_THRESHOLD
-net = cv2.dnn.readNet(settings.YOLO_WEIGHTS_PATH, settings.YOLO_CONFIG_PATH)
-
-def get_bounding_boxes(image):
+def decode_outputs(outputs, width, height, class_names, classes_of_interest_mask, conf_threshold, nms_threshold):
     '''
-    Return a list of bounding boxes of objects detected,
-    their classes and the confidences of the detections made.
+    Turn the raw outputs of the network for one image into bounding boxes, classes and confidences.
+    Each row of an output holds a detection: center x, center y, width, height (relative to the image size),
+    objectness and a score for each class.
     '''
+    detections = np.concatenate([output.reshape(-1, output.shape[-1]) for output in outputs])
+    scores = detections[:, 5:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
 
-    # create image blob
-    scale = 0.00392
-    image_blob = cv2.dnn.blobFromImage(image, scale, (416, 416), (0, 0, 0), True, crop=False)
-
-    # detect objects
-    net.setInput(image_blob)
-    layer_names = net.getLayerNames()
-    output_layers = [layer_names[i[0] - 1] for i in net.getUnconnectedOutLayers()]
-    outputs = net.forward(output_layers)
-
-    classes = []
-    confidences = []
-    boxes = []
-    nms_threshold = 0.4
-
-    for output in outputs:
-        for detection in output:
-            scores = detection[5:]
-            class_id = np.argmax(scores)
-            confidence = scores[class_id]
-            if confidence > conf_threshold and CLASSES[class_id] in CLASSES_OF_INTEREST:
-                width = image.shape[1]
-                height = image.shape[0]
-                center_x = int(detection[0] * width)
-                center_y = int(detection[1] * height)
-                w = int(detection[2] * width)
-                h = int(detection[3] * height)
-                x = center_x - w / 2
-                y = center_y - h / 2
-                classes.append(CLASSES[class_id])
-                confidences.append(float(confidence))
-                boxes.append([x, y, w, h])
+    keep = (confidences > conf_threshold) & classes_of_interest_mask[class_ids]
+    detections = detections[keep]
+    class_ids = class_ids[keep]
+    confidences = confidences[keep]
 
-    # remove overlapping bounding boxes
-    indices = cv2.dnn.NMSBoxes(boxes, confidences, conf_threshold, nms_threshold)
+    # box coordinates are truncated to integers the same way int() does
+    center_x = (detections[:, 0] * width).astype(np.int64)
+    center_y = (detections[:, 1] * height).astype(np.int64)
+    w = (detections[:, 2] * width).astype(np.int64)
+    h = (detections[:, 3] * height).astype(np.int64)
+    boxes = [list(box) for box in zip((center_x - w / 2).tolist(), (center_y - h / 2).tolist(), w.tolist(), h.tolist())]
+    confidences = confidences.tolist()
 
-    _bounding_boxes = []
-    _classes = []
-    _confidences = []
-    for i in indices:
-        i = i[0]
-        _bounding_boxes.append(boxes[i])
-        _classes.append(classes[i])
-        _confidences.append(confidences[i])
+    # remove overlapping bounding boxes
+    indices = np.array(cv2.dnn.NMSBoxes(boxes, confidences, conf_threshold, nms_threshold), dtype=np.int64).flatten()
 
+    _bounding_boxes = [boxes[i] for i in indices]
+    _classes = class_names[class_ids[indices]].tolist()
+    _confidences = [confidences[i] for i in indices]
     return _bounding_boxes, _classes, _confidences
+
+class Detector:
+    '''
+    YOLO network loaded with OpenCV's dnn module.
+    '''
+    def __init__(self):
+        with open(settings.YOLO_CLASSES_PATH, 'r') as classes_file:
+            self.classes = dict(enumerate([line.strip() for line in classes_file.readlines()]))
+        with open(settings.YOLO_CLASSES_OF_INTEREST_PATH, 'r') as coi_file:
+            self.classes_of_interest = tuple([line.strip() for line in coi_file.readlines()])
+        self.conf_threshold = settings.YOLO_CONFIDENCE_THRESHOLD
+        self.nms_threshold = settings.YOLO_NMS_THRESHOLD
+        self.input_size = settings.YOLO_INPUT_SIZE
+        # class names and classes of interest indexed by class id
+        self.class_names = np.array([self.classes[i] for i in range(len(self.classes))])
+        self.classes_of_interest_mask = np.isin(self.class_names, self.classes_of_interest)
+        self.net = cv2.dnn.readNet(settings.YOLO_WEIGHTS_PATH, settings.YOLO_CONFIG_PATH)
+
+        # names of the output layers of the network
+        # (getUnconnectedOutLayers returns a column vector in older OpenCV releases and a flat array in newer ones)
+        layer_names = self.net.getLayerNames()
+        self.output_layers = [layer_names[i - 1] for i in np.array(self.net.getUnconnectedOutLayers()).flatten()]
+
+    def _decode_outputs(self, outputs, width, height):
+        '''
+        Turn the raw outputs of the network for one image into bounding boxes, classes and confidences.
+        '''
+        return decode_outputs(outputs, width, height, self.class_names, self.classes_of_interest_mask,
+                              self.conf_threshold, self.nms_threshold)
+
+    def get_bounding_boxes(self, image):
+        '''
+        Return a list of bounding boxes of objects detected,
+        their classes and the confidences of the detections made.
+        '''
+
+        # create image blob
+        scale = 0.00392
+        image_blob = cv2.dnn.blobFromImage(image, scale, self.input_size, (0, 0, 0), True, crop=False)
+
+        # detect objects
+        self.net.setInput(image_blob)
+        outputs = self.net.forward(self.output_layers)
+
+        return self._decode_outputs(outputs, image.shape[1], image.shape[0])
+
+    def get_bounding_boxes_batch(self, images):
+        '''
+        Run detection on a list of images with a single forward pass.
+        Return a list with a (bounding boxes, classes, confidences) triple for each image.
+        '''
+        scale = 0.00392
+        image_blob = cv2.dnn.blobFromImages(images, scale, self.input_size, (0, 0, 0), True, crop=False)
+
+        self.net.setInput(image_blob)
+        outputs = self.net.forward(self.output_layers)
+        # depending on the OpenCV version, the outputs of a batch are either (N, rows, attributes)
+        # or (N * rows, attributes) with the rows of each image stored contiguously
+        outputs = [output.reshape(len(images), -1, output.shape[-1]) for output in outputs]
+
+        return [
+            self._decode_outputs([output[n] for output in outputs], image.shape[1], image.shape[0])
+            for n, image in enumerate(images)
+        ]
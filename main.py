@@ -4,8 +4,11 @@ VCS entry point.
 
 # pylint: disable=wrong-import-position
 
+import os
 import sys
 import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
 
@@ -18,6 +21,8 @@ parser.add_argument('cfgfile', nargs='?',default='.env',help='configuration file
 parser.add_argument('-v',default=None,help='video file, overrides what is set in config file',dest='video')
 parser.add_argument('-s',default=None,help='start at this timestamp, format HH:MM:SS',dest='start')
 parser.add_argument('-e',default=None,help='end at this timestamp, format HH:MM:SS',dest='end')
+parser.add_argument('-j',default=1,type=int,help='split the video into this many segments processed in parallel',dest='shards')
+parser.add_argument('--overlap',default=10,type=float,help='seconds each segment starts before its counting range',dest='overlap')
 
 args=parser.parse_args()
 from dotenv import load_dotenv
@@ -27,9 +32,17 @@ import settings
 from util.logger import init_logger
 from util.image import take_screenshot
 from util.logger import get_logger
-from util.debugger import mouse_callback
-from ObjectCounter import ObjectCounter
+from util.display import DebugDisplay
+from ObjectCounter import build_object_counter
 from progress import get_ProgressCounter
+from util.prefetch import FramePrefetcher, read_strided
+from util.frame_source import get_frame_source
+from util.recorder import VideoRecorder
+from util.detection_roi import get_roi_frame
+from detectors.detector import load_detector, get_detector_config
+from util.detection_cache import DetectionCache, get_video_hash, get_cache_key
+from util.trajectory import TrajectoryWriter
+from util.shards import get_shards, merge_count_events
 
 init_logger()
 logger = get_logger()
@@ -60,18 +73,59 @@ except ValueError as e:
 		parser.print_help()
 		exit()
 
-def run():
+def open_video(video, frame_stride=1):
 	'''
-	Initialize object counter class and run counting loop.
+	Open a video source with the frame source set in settings, exit if it can't be read.
+	The ffmpeg frame source skips frames itself when frame_stride > 1.
 	'''
-
-	video = settings.VIDEO
-	cap = cv2.VideoCapture(video)
+	if settings.FRAME_SOURCE == 'ffmpeg':
+		# frames are reused once read, keep enough of them for the frames decoded ahead
+		num_buffers = settings.PREFETCH_QUEUE_SIZE + 4 if settings.PREFETCH else 4
+		cap = get_frame_source(video, 'ffmpeg', scale=settings.FRAME_SOURCE_SCALE, crop=settings.FRAME_SOURCE_CROP,
+							   frame_step=frame_stride, threads=settings.FRAME_SOURCE_THREADS, num_buffers=num_buffers,
+							   ffmpeg_path=settings.FFMPEG_PATH)
+	else:
+		cap = get_frame_source(video)
 	if not cap.isOpened():
 		logger.error('Invalid video source %s', video, extra={
 			'meta': {'label': 'INVALID_VIDEO_SOURCE'},
 		})
 		sys.exit()
+	return cap
+
+def get_frame_range(fps, total_frames):
+	'''
+	Frames to process according to the -s and -e arguments.
+	'''
+	starting_frame = 0 if args.start is None else int(args.start*fps)
+	# last frame processed is the frame number ending_frame-1
+	# if starting_frame=0 and ending_frame=30 i will process 30 frames, from 0 to 29
+	ending_frame = total_frames if args.end is None else min(int(args.end*fps),total_frames)
+	return starting_frame, ending_frame
+
+def run(starting_frame=None, ending_frame=None, shard=None):
+	'''
+	Initialize object counter class and run counting loop.
+	Process frames [starting_frame, ending_frame), by default the range set with -s and -e.
+	shard is the index of the segment processed when the video is split (see run_sharded),
+	segments are processed headless, without recording and without trajectory export.
+	Return counts, count events and stats.
+	'''
+
+	video = settings.VIDEO
+	frame_stride = settings.FRAME_STRIDE
+	cap = open_video(video, frame_stride)
+	# frames left out by the frame source itself don't need to be skipped
+	read_stride = frame_stride if settings.FRAME_SOURCE == 'opencv' else 1
+	fps=cap.get(cv2.CAP_PROP_FPS)
+	total_frames=round(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+	if starting_frame is None or ending_frame is None:
+		starting_frame, ending_frame = get_frame_range(fps, total_frames)
+	if starting_frame > 0:
+		cap.set(cv2.CAP_PROP_POS_FRAMES,starting_frame)
+	progress=get_ProgressCounter()
+	progress.config(total_frames=total_frames,frame_rate=fps,starting_frame=starting_frame,ending_frame=ending_frame)
+
 	retval, frame = cap.read()
 	f_height, f_width, _ = frame.shape
 	detection_interval = settings.DI
@@ -84,37 +138,56 @@ def run():
 	droi = settings.DROI \
 			if use_droi \
 			else [(0, 0), (f_width, 0), (f_width, f_height), (0, f_height)]
-	show_droi = settings.SHOW_DROI
 	counting_lines = settings.COUNTING_LINES
-	show_counts = settings.SHOW_COUNTS
-	hud_color = settings.HUD_COLOR
-
-	object_counter = ObjectCounter(frame, detector, tracker, droi, show_droi, mcdf, mctf,
-								   detection_interval, counting_lines, show_counts, hud_color)
-
-	record = settings.RECORD
-	if record:
-		# initialize video object to record counting
-		output_video = cv2.VideoWriter(settings.OUTPUT_VIDEO_PATH, \
-										cv2.VideoWriter_fourcc(*'MJPG'), \
-										30, \
-										(f_width, f_height))
-	
-	fps=cap.get(cv2.CAP_PROP_FPS)
-	total_frames=round(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-	if args.start is None:
-		starting_frame=0
-	else:
-		starting_frame=int(args.start*fps)
-		cap.set(cv2.CAP_PROP_POS_FRAMES,starting_frame)
-		print(starting_frame,cap.get(cv2.CAP_PROP_POS_FRAMES))
-	# last frame processed is the frame number ending_frame-1
-	# if starting_frame=0 and ending_frame=30 i will process 30 frames, from 0 to 29
-	if args.end is None:
-		ending_frame=total_frames
+	# scale and crop of the frames in the video, if any
+	frame_transform = cap.get_transform() if settings.FRAME_SOURCE == 'ffmpeg' else None
+	if frame_transform is not None:
+		# settings are in the coordinates of the video, ffmpeg crops and resizes frames
+		if use_droi:
+			droi = cap.transform_points(droi)
+		counting_lines = [dict(line, line=cap.transform_points(line['line'])) for line in counting_lines]
+
+	detection_cache = None
+	if settings.DETECTION_CACHE:
+		video_hash = get_video_hash(video)
+		if video_hash is None:
+			logger.warning('Detection cache is only available for video files.', extra={
+				'meta': {'label': 'DETECTION_CACHE_UNAVAILABLE', 'video': video},
+			})
+		else:
+			cache_config = dict(get_detector_config(detector), droi=droi, droi_crop=settings.DROI_CROP)
+			if settings.FRAME_SOURCE == 'ffmpeg':
+				cache_config['frame_source'] = {'scale': settings.FRAME_SOURCE_SCALE, 'crop': settings.FRAME_SOURCE_CROP}
+			cache_path = os.path.join(settings.DETECTION_CACHE_DIRECTORY,
+									  get_cache_key(video_hash, detector, cache_config) + '.npz')
+			detection_cache = DetectionCache(cache_path)
+
+	if detection_cache is None:
+		# load the detector model and warm it up on the first frame
+		detector_timings = load_detector(detector, get_roi_frame(frame, droi, settings.DROI_CROP), settings.DETECTOR_WARMUP_RUNS)
 	else:
-		ending_frame=min(int(args.end*fps),total_frames)
-	
+		# the detector is loaded on the first cache miss, if any
+		detector_timings = None
+
+	trajectory_writer = TrajectoryWriter(settings.TRAJECTORY_PATH) if settings.TRAJECTORY_EXPORT and shard is None else None
+	# segments share the machine's cores
+	tracker_threads = settings.TRACKER_THREADS if shard is None else max(1, settings.TRACKER_THREADS // args.shards)
+
+	object_counter = build_object_counter(frame, {'TRACKER': tracker, 'DI': detection_interval, 'MCDF': mcdf, 'MCTF': mctf},
+										  droi, counting_lines, tracker_threads,
+										  detection_cache=detection_cache, trajectory_writer=trajectory_writer)
+	counting_lines = object_counter.counting_lines
+
+	recorder = None
+	if settings.RECORD and shard is None:
+		# record counting at the rate frames are processed, frames are encoded on a separate thread
+		# (some streams don't report their frame rate)
+		record_fps = (fps or 30) / frame_stride
+		recorder = VideoRecorder(settings.OUTPUT_VIDEO_PATH, record_fps, (f_width, f_height),
+								 settings.RECORD_CODEC, settings.RECORD_MODE,
+								 clip_before=round(settings.RECORD_CLIP_BEFORE * record_fps),
+								 clip_after=round(settings.RECORD_CLIP_AFTER * record_fps))
+
 	logger.info('Processing started.', extra={
 		'meta': {
 			'label': 'START_PROCESS',
@@ -124,37 +197,49 @@ def run():
 			},
 			'counter_config': {
 				'di': detection_interval,
+				'adaptive_di': (settings.DI_MIN, settings.DI_MAX) if settings.ADAPTIVE_DI else None,
+				'motion_gate': settings.MOTION_GATE,
 				'mcdf': mcdf,
 				'mctf': mctf,
 				'detector': detector,
+				'detector_timings': detector_timings,
 				'tracker': tracker,
 				'use_droi': use_droi,
 				'droi': droi,
-				'counting_lines': counting_lines
+				'droi_crop': settings.DROI_CROP,
+				'counting_lines': counting_lines,
+				'frame_stride': frame_stride,
 			},
 			'range':{
 				'start':starting_frame,
 				'end':ending_frame,
 				'total':total_frames,
-			}
+			},
+			'shard': shard,
 		},
 	})
 
-	headless = settings.HEADLESS
-	if not headless:
-		# capture mouse events in the debug window
-		cv2.namedWindow('Debug')
-		cv2.setMouseCallback('Debug', mouse_callback, {'frame_width': f_width, 'frame_height': f_height})
+	headless = settings.HEADLESS or shard is not None
+	# the debug window is refreshed on its own thread, it also captures keys and mouse events
+	display = DebugDisplay(settings.DEBUG_WINDOW_SIZE, (f_width, f_height), settings.DEBUG_DISPLAY_FPS,
+						   frame_transform=frame_transform) if not headless else None
 
 	is_paused = False
 	output_frame = None
-	progress=get_ProgressCounter()
-	progress.config(total_frames=total_frames,frame_rate=fps,starting_frame=starting_frame,ending_frame=ending_frame)
+	# the HUD is only drawn when frames are shown or recorded (screenshots are taken from the debug window)
+	render = not headless or recorder is not None
+
+	prefetcher = None
+	droi_frame = None
+	if settings.PREFETCH:
+		# decode (and optionally mask) the next frames while the current one is being processed
+		prepare = object_counter.get_droi_frame if settings.PREFETCH_DROI else None
+		prefetcher = FramePrefetcher(cap, settings.PREFETCH_QUEUE_SIZE, prepare, read_stride)
 
 	try:
 		# main loop
 		while retval and progress.remaining_frames()>0:
-			k = cv2.waitKey(1) & 0xFF
+			k = display.get_key() if display is not None else None
 			if k == ord('p'): # pause/play loop if 'p' key is pressed
 				is_paused = False if is_paused else True
 				logger.info('Loop paused/played.', extra={'meta': {'label': 'PAUSE_PLAY_LOOP', 'is_paused': is_paused}})
@@ -170,47 +255,112 @@ def run():
 
 			_timer = cv2.getTickCount() # set timer to calculate processing frame rate
 
-			object_counter.count(frame)
-			output_frame = object_counter.visualize()
-
-			if record:
-				output_video.write(output_frame)
-
-			if not headless:
-				debug_window_size = settings.DEBUG_WINDOW_SIZE
-				resized_frame = cv2.resize(output_frame, debug_window_size)
-				cv2.imshow('Debug', resized_frame)
-
-			processing_frame_rate = round(cv2.getTickFrequency() / (cv2.getTickCount() - _timer), 2)
-			progress.incframe()
-			logger.debug('Frame processed.', extra={
-				'meta': {
-					'label': 'FRAME_PROCESS',
-					'next_frame': progress.frame(),
-					'frames_processed': progress.processed(),
-					'frame_rate': processing_frame_rate,
-					'frames_left': progress.remaining_frames(),
-					'percentage_processed': round(progress.progress() * 100, 2),
-				},
-			})
+			num_count_events = len(object_counter.get_count_events())
+			object_counter.count(frame, droi_frame)
+			if render:
+				output_frame = object_counter.visualize()
+
+			if recorder is not None:
+				counted = len(object_counter.get_count_events()) > num_count_events
+				recorder.write(output_frame, progress.frame(), counted)
+
+			if display is not None:
+				display.show(output_frame)
 
-			retval, frame = cap.read()
+			progress.incframe(frame_stride)
+			if logger.isEnabledFor(logging.DEBUG):
+				processing_frame_rate = round(cv2.getTickFrequency() / (cv2.getTickCount() - _timer), 2)
+				logger.debug('Frame processed.', extra={
+					'meta': {
+						'label': 'FRAME_PROCESS',
+						'next_frame': progress.frame(),
+						'frames_processed': progress.processed(),
+						'frame_rate': processing_frame_rate,
+						'frames_left': progress.remaining_frames(),
+						'percentage_processed': round(progress.progress() * 100, 2),
+					},
+				})
+
+			if prefetcher is not None:
+				retval, frame, droi_frame = prefetcher.read()
+			else:
+				retval, frame = read_strided(cap, read_stride)
 	finally:
 		# end capture, close window, close log file and video object if any
+		if prefetcher is not None:
+			prefetcher.stop()
 		cap.release()
-		if not headless:
-			cv2.destroyAllWindows()
-		if record:
-			output_video.release()
+		if display is not None:
+			display.close()
+		if recorder is not None:
+			recorder.close()
+		object_counter.close()
+		if detection_cache is not None:
+			detection_cache.save()
+		if trajectory_writer is not None:
+			trajectory_writer.save(video=video, fps=fps, starting_frame=starting_frame, frame_stride=frame_stride,
+								   counting_lines=counting_lines, frame_transform=frame_transform)
 		logger.info('Processing ended.', extra={
 			'meta': {
 				'label': 'END_PROCESS',
 				'counts': object_counter.get_counts(),
+				'stats': object_counter.get_stats(),
+				'recording': recorder.get_stats() if recorder is not None else None,
 				'completed': progress.progress() == 1,
 				'completed_p':round(progress.progress() * 100, 2),
+				'shard': shard,
 			},
 		})
 
+	return {
+		'counts': object_counter.get_counts(),
+		'count_events': object_counter.get_count_events(),
+		'stats': object_counter.get_stats(),
+		'completed': progress.progress() == 1,
+	}
+
+def run_sharded(num_shards, overlap):
+	'''
+	Split the video into num_shards time segments, count objects in each of them in a separate process
+	and merge the counts. Each segment starts overlap seconds early so that objects already in view are tracked,
+	objects counted in these overlaps are only counted once.
+	'''
+	cap = open_video(settings.VIDEO)
+	fps=cap.get(cv2.CAP_PROP_FPS)
+	total_frames=round(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+	cap.release()
+	starting_frame, ending_frame = get_frame_range(fps, total_frames)
+	shards = get_shards(starting_frame, ending_frame, num_shards, int(overlap * fps))
+	if settings.TRAJECTORY_EXPORT:
+		logger.warning('Trajectories are not exported when the video is split into segments.', extra={
+			'meta': {'label': 'TRAJECTORY_EXPORT_UNAVAILABLE', 'shards': len(shards)},
+		})
+
+	with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+		results = list(executor.map(run, [start for start, _, _ in shards], [end for _, _, end in shards], range(len(shards))))
+
+	# shards may register the crossing of an object seen by both of them up to a couple of detections apart
+	# (DI counts processed frames, the tolerance is in video frames)
+	max_detection_interval = settings.DI_MAX if settings.ADAPTIVE_DI else settings.DI
+	tolerance = 2 * max_detection_interval * settings.FRAME_STRIDE
+	counts, count_events = merge_count_events([result['count_events'] for result in results], shards,
+											  settings.COUNTING_LINES, tolerance)
+	logger.info('Sharded processing ended.', extra={
+		'meta': {
+			'label': 'END_SHARDED_PROCESS',
+			'counts': counts,
+			'duplicates_removed': sum(len(result['count_events']) for result in results) - len(count_events),
+			'shards': [
+				{'start': start, 'counting_start': counting_start, 'end': end, 'completed': result['completed']}
+				for (start, counting_start, end), result in zip(shards, results)
+			],
+		},
+	})
+	return counts
+
 
 if __name__ == '__main__':
-	run()
+	if args.shards > 1:
+		run_sharded(args.shards, args.overlap)
+	else:
+		run()
@@ -0,0 +1,180 @@
+'''
+Count objects in several videos or camera streams in a single process.
+All streams share one detector: their detection requests are queued and run in batches.
+Each stream can be configured with its own configuration file holding the stream settings
+(VIDEO, USE_DROI, DROI, COUNTING_LINES, DI, MCDF, MCTF, TRACKER), other settings are read from the main configuration file.
+'''
+
+# pylint: disable=wrong-import-position
+
+import ast
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+import argparse
+parser = argparse.ArgumentParser(description='Count vehicles in several videos sharing one detector')
+parser.add_argument('cfgfile', nargs='?', default='.env', help='configuration file')
+parser.add_argument('-s', action='append', default=[], help='stream configuration file, can be repeated', dest='streams')
+parser.add_argument('-v', action='append', default=[], help='video file using the stream settings of the configuration file, can be repeated', dest='videos')
+
+args = parser.parse_args()
+from dotenv import load_dotenv, dotenv_values
+load_dotenv(args.cfgfile)
+
+import settings
+from util.logger import init_logger, get_logger
+from util.detection_queue import DetectionQueue
+from ObjectCounter import build_object_counter
+from progress import ProgressCounter
+from detectors.detector import load_detector
+from counter import test_lines
+from util.prefetch import read_strided
+
+init_logger()
+logger = get_logger()
+
+# settings that can be set for each stream and how to parse them
+_STREAM_SETTINGS = {
+	'VIDEO': str,
+	'USE_DROI': ast.literal_eval,
+	'DROI': ast.literal_eval,
+	'COUNTING_LINES': ast.literal_eval,
+	'DI': int,
+	'MCDF': int,
+	'MCTF': int,
+	'TRACKER': str,
+}
+
+
+def get_stream_config(path=None, video=None):
+	'''
+	Read the settings of a stream from a configuration file.
+	Settings not set in the file are taken from the main configuration file.
+	'''
+	config = {name: getattr(settings, name, None) for name in _STREAM_SETTINGS}
+	if path is not None:
+		for name, value in dotenv_values(path).items():
+			if name in _STREAM_SETTINGS and value is not None:
+				try:
+					config[name] = _STREAM_SETTINGS[name](value)
+				except (ValueError, SyntaxError):
+					print('Invalid value for {} in {}.'.format(name, path))
+					sys.exit()
+	if video is not None:
+		config['VIDEO'] = video
+	err = test_lines(config['COUNTING_LINES'] or [])
+	if err is not None:
+		print(err)
+		sys.exit()
+	return config
+
+def run_stream(stream, config, detection_queue, tracker_threads):
+	'''
+	Run the counting loop of a stream.
+	Return its counts and stats, None if the stream can't be read.
+	'''
+	video = config['VIDEO']
+	cap = cv2.VideoCapture(video)
+	retval, frame = cap.read() if cap.isOpened() else (False, None)
+	if not retval:
+		logger.error('Invalid video source %s', video, extra={
+			'meta': {'label': 'INVALID_VIDEO_SOURCE', 'stream': stream},
+		})
+		return None
+
+	fps = cap.get(cv2.CAP_PROP_FPS)
+	total_frames = round(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+	progress = ProgressCounter()
+	progress.config(total_frames=total_frames, frame_rate=fps)
+
+	f_height, f_width, _ = frame.shape
+	droi = config['DROI'] \
+			if config['USE_DROI'] \
+			else [(0, 0), (f_width, 0), (f_width, f_height), (0, f_height)]
+	counting_lines = config['COUNTING_LINES'] or []
+	object_counter = build_object_counter(frame, config, droi, counting_lines, tracker_threads,
+										  progress=progress, detection_queue=detection_queue)
+	counting_lines = object_counter.counting_lines
+
+	logger.info('Processing started.', extra={
+		'meta': {
+			'label': 'START_PROCESS',
+			'stream': stream,
+			'sources': {
+				'.env file': args.cfgfile,
+				'video file': video,
+			},
+			'counter_config': {
+				'di': config['DI'],
+				'mcdf': config['MCDF'],
+				'mctf': config['MCTF'],
+				'detector': settings.DETECTOR,
+				'tracker': config['TRACKER'],
+				'use_droi': config['USE_DROI'],
+				'droi': droi,
+				'counting_lines': counting_lines,
+			},
+		},
+	})
+
+	try:
+		while retval and progress.remaining_frames() > 0:
+			object_counter.count(frame)
+			progress.incframe(settings.FRAME_STRIDE)
+			retval, frame = read_strided(cap, settings.FRAME_STRIDE)
+	finally:
+		cap.release()
+		object_counter.close()
+		logger.info('Processing ended.', extra={
+			'meta': {
+				'label': 'END_PROCESS',
+				'stream': stream,
+				'counts': object_counter.get_counts(),
+				'stats': object_counter.get_stats(),
+				'completed': progress.progress() == 1,
+				'completed_p': round(progress.progress() * 100, 2),
+			},
+		})
+
+	return {
+		'counts': object_counter.get_counts(),
+		'stats': object_counter.get_stats(),
+		'completed': progress.progress() == 1,
+	}
+
+def run():
+	'''
+	Load the detector once and process all streams concurrently.
+	'''
+	configs = [get_stream_config(path) for path in args.streams] + [get_stream_config(video=video) for video in args.videos]
+	if not configs:
+		configs = [get_stream_config()]
+	streams = range(len(configs))
+	# streams share the machine's cores
+	tracker_threads = max(1, settings.TRACKER_THREADS // len(configs))
+
+	load_detector(settings.DETECTOR)
+	detection_queue = DetectionQueue(settings.DETECTOR, settings.DETECTION_BATCH_SIZE, settings.DETECTION_BATCH_WAIT)
+	try:
+		with ThreadPoolExecutor(max_workers=len(configs)) as executor:
+			results = list(executor.map(run_stream, streams, configs,
+										[detection_queue] * len(configs), [tracker_threads] * len(configs)))
+	finally:
+		detection_queue.stop()
+
+	logger.info('Multistream processing ended.', extra={
+		'meta': {
+			'label': 'END_MULTISTREAM_PROCESS',
+			'streams': [
+				{'video': config['VIDEO'], 'counts': result['counts'] if result is not None else None}
+				for config, result in zip(configs, results)
+			],
+			'detection_queue': detection_queue.get_stats(),
+		},
+	})
+	return results
+
+
+if __name__ == '__main__':
+	run()
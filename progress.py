@@ -54,8 +54,8 @@ class ProgressCounter:
 	def processed(self):
 		return self.fn-self.start
 	
-	def incframe(self):
-		self.fn+=1
+	def incframe(self,n=1):
+		self.fn+=n
 		
 _p=ProgressCounter()
 
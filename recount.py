@@ -0,0 +1,64 @@
+'''
+Recount objects from a trajectory file, without processing the video again.
+Trajectory files are written when TRAJECTORY_EXPORT is on.
+Counting lines are read from the configuration file (COUNTING_LINES) or passed with -l.
+'''
+
+# pylint: disable=wrong-import-position
+
+import ast
+import argparse
+parser = argparse.ArgumentParser(description='Recount objects from a trajectory file')
+parser.add_argument('trajectories', help='trajectory file')
+parser.add_argument('cfgfile', nargs='?', default='.env', help='configuration file')
+parser.add_argument('-l', default=None, help='counting lines, overrides what is set in config file', dest='lines')
+
+args = parser.parse_args()
+from dotenv import load_dotenv
+load_dotenv(args.cfgfile)
+
+import settings
+from util.logger import init_logger, get_logger
+from util.trajectory import load_trajectories
+from util.frame_source import transform_points
+from counter import recount, test_lines, get_cross_mode_lines
+
+init_logger()
+logger = get_logger()
+
+
+def run():
+	'''
+	Load trajectories and counting lines, then recount objects.
+	'''
+	counting_lines = ast.literal_eval(args.lines) if args.lines is not None else settings.COUNTING_LINES
+	err = test_lines(counting_lines)
+	if err is not None:
+		print(err)
+		parser.print_help()
+		return
+
+	trajectories = load_trajectories(args.trajectories)
+	frame_transform = trajectories['metadata'].get('frame_transform')
+	if frame_transform is not None:
+		# objects were tracked on frames cropped and resized by the frame source, lines are in video coordinates
+		counting_lines = [dict(line, line=transform_points(line['line'], **frame_transform)) for line in counting_lines]
+	if trajectories['metadata'].get('frame_stride', 1) > 1:
+		# objects were tracked on every few frames only
+		counting_lines = get_cross_mode_lines(counting_lines)
+	counts, events = recount(trajectories, counting_lines)
+	for event in events:
+		logger.info('Object counted.', extra={'meta': dict(event, label='OBJECT_COUNT')})
+	logger.info('Recount ended.', extra={
+		'meta': {
+			'label': 'END_RECOUNT',
+			'trajectories': args.trajectories,
+			'source': trajectories['metadata'],
+			'counting_lines': counting_lines,
+			'counts': counts,
+		},
+	})
+
+
+if __name__ == '__main__':
+	run()
@@ -4,6 +4,7 @@ App settings.
 
 import os
 import ast
+import multiprocessing
 from counter import test_lines
 
 
@@ -34,6 +35,13 @@ if USE_DROI:
         print('Invalid value for DROI. It should be a list of coordinates (2-tuples).')
         ENVS_READY = False
 
+# Crop frames to the bounding rectangle of the detection ROI before running detection
+try:
+    DROI_CROP = ast.literal_eval(os.getenv('DROI_CROP', 'False'))
+except ValueError:
+    print('Invalid value for DROI_CROP. It should be either True or False.')
+    ENVS_READY = False
+
 # Display/overlay the detection ROI on the video
 try:
     SHOW_DROI = ast.literal_eval(os.getenv('SHOW_DROI', 'False'))
@@ -72,12 +80,157 @@ except ValueError:
     print('Invalid value for DI. It should be a positive integer.')
     ENVS_READY = False
 
+# Adapt the detection interval to the activity of the scene, between DI_MIN and DI_MAX frames
+# (DI is the initial interval)
+try:
+    ADAPTIVE_DI = ast.literal_eval(os.getenv('ADAPTIVE_DI', 'False'))
+except ValueError:
+    print('Invalid value for ADAPTIVE_DI. It should be either True or False.')
+    ENVS_READY = False
+
+try:
+    DI_MIN = int(os.getenv('DI_MIN', '2'))
+    if DI_MIN < 1:
+        raise ValueError(DI_MIN)
+except ValueError:
+    print('Invalid value for DI_MIN. It should be a positive integer.')
+    ENVS_READY = False
+
+try:
+    DI_MAX = int(os.getenv('DI_MAX', '30'))
+    if DI_MAX < 1:
+        raise ValueError(DI_MAX)
+except ValueError:
+    print('Invalid value for DI_MAX. It should be a positive integer.')
+    ENVS_READY = False
+
+try:
+    if ADAPTIVE_DI and not DI_MIN <= DI <= DI_MAX:
+        print('Invalid values for DI_MIN, DI and DI_MAX. They should be such that DI_MIN <= DI <= DI_MAX.')
+        ENVS_READY = False
+except NameError:
+    pass # one of them is invalid, which is already reported
+
+# Skip detection when nothing moves in the detection ROI and no object is tracked (options: none, diff, mog2)
+# diff compares downscaled frames, mog2 uses a background model
+MOTION_GATE = os.getenv('MOTION_GATE', 'none')
+if MOTION_GATE not in ['none', 'diff', 'mog2']:
+    print('Invalid value for MOTION_GATE. It should be either none, diff or mog2.')
+    ENVS_READY = False
+
+# Share of the detection ROI that must change for motion to be detected
+try:
+    MOTION_GATE_THRESHOLD = float(os.getenv('MOTION_GATE_THRESHOLD', '0.002'))
+except ValueError:
+    print('Invalid value for MOTION_GATE_THRESHOLD. It should be a number between 0 and 1.')
+    ENVS_READY = False
+
+# Maximum number of detections skipped in a row
+try:
+    MOTION_GATE_MAX_SKIPS = int(os.getenv('MOTION_GATE_MAX_SKIPS', '10'))
+except ValueError:
+    print('Invalid value for MOTION_GATE_MAX_SKIPS. It should be a non-negative integer.')
+    ENVS_READY = False
+
 # Model/algorithm to use for object detection (options: yolo, tfoda, detectron2, haarcascade)
 DETECTOR = os.getenv('DETECTOR', 'yolo')
 
-# Algorithm to use for object tracking (options: kcf, csrt)
+# Number of inferences run on the first frame to warm up the detector before processing starts
+try:
+    DETECTOR_WARMUP_RUNS = int(os.getenv('DETECTOR_WARMUP_RUNS', '1'))
+except ValueError:
+    print('Invalid value for DETECTOR_WARMUP_RUNS. It should be a non-negative integer.')
+    ENVS_READY = False
+
+# Maximum number of frames, from all streams, run together by the detector in multistream mode
+try:
+    DETECTION_BATCH_SIZE = int(os.getenv('DETECTION_BATCH_SIZE', '8'))
+except ValueError:
+    print('Invalid value for DETECTION_BATCH_SIZE. It should be a positive integer.')
+    ENVS_READY = False
+
+# Time (in seconds) the detector waits for other streams to fill a batch in multistream mode
+try:
+    DETECTION_BATCH_WAIT = float(os.getenv('DETECTION_BATCH_WAIT', '0.01'))
+except ValueError:
+    print('Invalid value for DETECTION_BATCH_WAIT. It should be a non-negative number.')
+    ENVS_READY = False
+
+# Run detection on a worker thread while trackers keep processing the following frames
+# Detections are moved along with the tracked objects when they are added
+try:
+    ASYNC_DETECTION = ast.literal_eval(os.getenv('ASYNC_DETECTION', 'False'))
+except ValueError:
+    print('Invalid value for ASYNC_DETECTION. It should be either True or False.')
+    ENVS_READY = False
+
+# Store detector outputs on disk and reuse them when the same video is processed again
+# with the same detector configuration and detection ROI
+try:
+    DETECTION_CACHE = ast.literal_eval(os.getenv('DETECTION_CACHE', 'False'))
+except ValueError:
+    print('Invalid value for DETECTION_CACHE. It should be either True or False.')
+    ENVS_READY = False
+
+# Absolute/relative path to detection cache directory
+if DETECTION_CACHE:
+    DETECTION_CACHE_DIRECTORY = os.getenv('DETECTION_CACHE_DIRECTORY', './data/cache/')
+
+# Algorithm to use for object tracking (options: kcf, csrt, sort)
+# sort predicts boxes with Kalman filters, without looking at the frames
 TRACKER = os.getenv('TRACKER', 'kcf')
 
+# Keep the tracker of an object matched with a detection, unless the overlap of the tracked and detected boxes
+# is below TRACKER_REINIT_OVERLAP or the type of the object changed
+try:
+    LAZY_TRACKER_REINIT = ast.literal_eval(os.getenv('LAZY_TRACKER_REINIT', 'False'))
+except ValueError:
+    print('Invalid value for LAZY_TRACKER_REINIT. It should be either True or False.')
+    ENVS_READY = False
+
+try:
+    TRACKER_REINIT_OVERLAP = float(os.getenv('TRACKER_REINIT_OVERLAP', '0.8'))
+except ValueError:
+    print('Invalid value for TRACKER_REINIT_OVERLAP. It should be a number between 0 and 1.')
+    ENVS_READY = False
+
+# Scale of the frames passed to trackers (e.g 0.5 to track objects on frames of half the width and height)
+try:
+    TRACKING_SCALE = float(os.getenv('TRACKING_SCALE', '1.0'))
+    if TRACKING_SCALE <= 0:
+        raise ValueError(TRACKING_SCALE)
+except ValueError:
+    print('Invalid value for TRACKING_SCALE. It should be a positive number.')
+    ENVS_READY = False
+
+# Pass grayscale frames to trackers (ignored by sort)
+try:
+    TRACKING_GRAYSCALE = ast.literal_eval(os.getenv('TRACKING_GRAYSCALE', 'False'))
+except ValueError:
+    print('Invalid value for TRACKING_GRAYSCALE. It should be either True or False.')
+    ENVS_READY = False
+
+# Algorithm used to match detections with tracked objects (options: greedy, hungarian)
+# hungarian requires scipy
+MATCHING_ALGORITHM = os.getenv('MATCHING_ALGORITHM', 'greedy')
+if MATCHING_ALGORITHM not in ['greedy', 'hungarian']:
+    print('Invalid value for MATCHING_ALGORITHM. It should be either greedy or hungarian.')
+    ENVS_READY = False
+
+# Number of threads used to update object trackers
+try:
+    TRACKER_THREADS = int(os.getenv('TRACKER_THREADS', str(multiprocessing.cpu_count())))
+except ValueError:
+    print('Invalid value for TRACKER_THREADS. It should be a positive integer.')
+    ENVS_READY = False
+
+# Trackers are updated serially (without the thread pool) when there are fewer blobs than this
+try:
+    TRACKER_PARALLEL_MIN_BLOBS = int(os.getenv('TRACKER_PARALLEL_MIN_BLOBS', '8'))
+except ValueError:
+    print('Invalid value for TRACKER_PARALLEL_MIN_BLOBS. It should be a positive integer.')
+    ENVS_READY = False
+
 # Record object counting as video
 try:
     RECORD = ast.literal_eval(os.getenv('RECORD', 'False'))
@@ -93,6 +246,43 @@ if RECORD:
         print('Output video path not set.')
         ENVS_READY = False
 
+# FourCC code of the codec used to record videos
+RECORD_CODEC = os.getenv('RECORD_CODEC', 'MJPG')
+if len(RECORD_CODEC) != 4:
+    print('Invalid value for RECORD_CODEC. It should be a 4 character code.')
+    ENVS_READY = False
+
+# Record the whole video (full) or only clips around object counts (events)
+# Clips are saved next to OUTPUT_VIDEO_PATH, with the number of the frame of their first count appended to its name
+RECORD_MODE = os.getenv('RECORD_MODE', 'full')
+if RECORD_MODE not in ['full', 'events']:
+    print('Invalid value for RECORD_MODE. It should be either full or events.')
+    ENVS_READY = False
+
+# Number of seconds recorded before and after an object count in events mode
+try:
+    RECORD_CLIP_BEFORE = float(os.getenv('RECORD_CLIP_BEFORE', '2'))
+    RECORD_CLIP_AFTER = float(os.getenv('RECORD_CLIP_AFTER', '3'))
+except ValueError:
+    print('Invalid value for RECORD_CLIP_BEFORE or RECORD_CLIP_AFTER. They should be positive numbers.')
+    ENVS_READY = False
+
+# Record the trajectories of all objects so that they can be recounted
+# with different counting lines without processing the video again (see recount.py)
+try:
+    TRAJECTORY_EXPORT = ast.literal_eval(os.getenv('TRAJECTORY_EXPORT', 'False'))
+except ValueError:
+    print('Invalid value for TRAJECTORY_EXPORT. It should be either True or False.')
+    ENVS_READY = False
+
+# Set path where trajectories will be stored (.npz file)
+if TRAJECTORY_EXPORT:
+    if os.getenv('TRAJECTORY_PATH'):
+        TRAJECTORY_PATH = os.getenv('TRAJECTORY_PATH')
+    else:
+        print('Trajectory path not set.')
+        ENVS_READY = False
+
 # Run VCS without UI display
 try:
     HEADLESS = ast.literal_eval(os.getenv('HEADLESS', 'False'))
@@ -100,6 +290,74 @@ except ValueError:
     print('Invalid value for HEADLESS. It should be either True or False.')
     ENVS_READY = False
 
+# Library used to decode videos (options: opencv, ffmpeg)
+# ffmpeg decodes frames in a separate process and can crop and resize them before they reach Python
+FRAME_SOURCE = os.getenv('FRAME_SOURCE', 'opencv')
+if FRAME_SOURCE not in ['opencv', 'ffmpeg']:
+    print('Invalid value for FRAME_SOURCE. It should be either opencv or ffmpeg.')
+    ENVS_READY = False
+
+# Path to the ffmpeg executable
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+
+# Scale of the frames decoded by ffmpeg
+# DROI and COUNTING_LINES are given in the coordinates of the video and converted
+try:
+    FRAME_SOURCE_SCALE = float(os.getenv('FRAME_SOURCE_SCALE', '1.0'))
+    if FRAME_SOURCE_SCALE <= 0:
+        raise ValueError(FRAME_SOURCE_SCALE)
+except ValueError:
+    print('Invalid value for FRAME_SOURCE_SCALE. It should be a positive number.')
+    ENVS_READY = False
+
+# Area (x, y, w, h) of the video frames are cropped to by ffmpeg, before they are resized
+# E.g (0, 540, 1920, 540)
+try:
+    FRAME_SOURCE_CROP = ast.literal_eval(os.getenv('FRAME_SOURCE_CROP', 'None'))
+except ValueError:
+    print('Invalid value for FRAME_SOURCE_CROP. It should be a (x, y, w, h) tuple or None.')
+    ENVS_READY = False
+
+# Number of decoding threads used by ffmpeg (0 lets ffmpeg decide)
+try:
+    FRAME_SOURCE_THREADS = int(os.getenv('FRAME_SOURCE_THREADS', '0'))
+except ValueError:
+    print('Invalid value for FRAME_SOURCE_THREADS. It should be a non-negative integer.')
+    ENVS_READY = False
+
+# Process only every FRAME_STRIDE-th frame, the others are skipped without being decoded into images
+# Counting lines are switched to 'cross' mode (lookfor cc or corners) when frames are skipped
+try:
+    FRAME_STRIDE = int(os.getenv('FRAME_STRIDE', '1'))
+    if FRAME_STRIDE < 1:
+        raise ValueError(FRAME_STRIDE)
+except ValueError:
+    print('Invalid value for FRAME_STRIDE. It should be a positive integer.')
+    ENVS_READY = False
+
+# Decode frames ahead on a background thread
+try:
+    PREFETCH = ast.literal_eval(os.getenv('PREFETCH', 'False'))
+except ValueError:
+    print('Invalid value for PREFETCH. It should be either True or False.')
+    ENVS_READY = False
+
+# Maximum number of frames decoded ahead when PREFETCH is on
+try:
+    PREFETCH_QUEUE_SIZE = int(os.getenv('PREFETCH_QUEUE_SIZE', '8'))
+    if PREFETCH_QUEUE_SIZE < 1:
+        raise ValueError(PREFETCH_QUEUE_SIZE)
+except ValueError:
+    print('Invalid value for PREFETCH_QUEUE_SIZE. It should be a positive integer.')
+    ENVS_READY = False
+
+# Also prepare the detection ROI frame on the background thread when PREFETCH is on
+try:
+    PREFETCH_DROI = ast.literal_eval(os.getenv('PREFETCH_DROI', 'False'))
+except ValueError:
+    print('Invalid value for PREFETCH_DROI. It should be either True or False.')
+    ENVS_READY = False
+
 # Specify one or more counting lines
 # A counting line is represented by a label and line segment
 # E.g {'label': 'A', 'line': [(667, 713), (888, 713)]}
@@ -157,6 +415,16 @@ if DETECTOR == 'yolo':
         print('YOLO_WEIGHTS_PATH, YOLO_CONFIG_PATH, YOLO_CLASSES_PATH, YOLO_CLASSES_OF_INTEREST_PATH, ' +
               'and/or YOLO_CONFIDENCE_THRESHOLD not set or invalid.')
         ENVS_READY = False
+    # Size of the network input, either a single number or a 2-tuple (width, height), multiples of 32
+    try:
+        YOLO_INPUT_SIZE = ast.literal_eval(os.getenv('YOLO_INPUT_SIZE', '416'))
+        if isinstance(YOLO_INPUT_SIZE, int):
+            YOLO_INPUT_SIZE = (YOLO_INPUT_SIZE, YOLO_INPUT_SIZE)
+        YOLO_NMS_THRESHOLD = float(os.getenv('YOLO_NMS_THRESHOLD', '0.4'))
+    except ValueError:
+        print('Invalid value for YOLO_INPUT_SIZE and/or YOLO_NMS_THRESHOLD. ' +
+              'They should be an integer or a 2-tuple (width, height) and a number between 0 and 1.')
+        ENVS_READY = False
 
 # Configs for Detectron2 detector
 if DETECTOR == 'detectron2':
@@ -178,6 +446,7 @@ if DETECTOR == 'detectron2':
         ENVS_READY = False
 
 # Log destinations
+# Records are written on a separate thread, file logs are serialized with orjson when it is installed
 try:
     ENABLE_CONSOLE_LOGGER = ast.literal_eval(os.getenv('ENABLE_CONSOLE_LOGGER', 'True'))
     ENABLE_FILE_LOGGER = ast.literal_eval(os.getenv('ENABLE_FILE_LOGGER', 'True'))
@@ -186,6 +455,13 @@ except ValueError:
           'ENABLE_FILE_LOGGER. They should be either True or False.')
     ENVS_READY = False
 
+# Minimum level of the records logged (options: DEBUG, INFO, WARNING, ERROR)
+# DEBUG logs every frame and every object update, which slows processing down
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+if LOG_LEVEL not in ['DEBUG', 'INFO', 'WARNING', 'ERROR']:
+    print('Invalid value for LOG_LEVEL. It should be one of DEBUG, INFO, WARNING or ERROR.')
+    ENVS_READY = False
+
 # Absolute/relative path to log files directory
 if ENABLE_FILE_LOGGER:
     LOG_FILES_DIRECTORY = os.getenv('LOG_FILES_DIRECTORY', './data/logs/')
@@ -207,6 +483,16 @@ except ValueError:
     print('Invalid value for DEBUG_WINDOW_SIZE. It should be a 2-tuple: (width, height).')
     ENVS_READY = False
 
+# Maximum number of frames per second shown in the debug window
+# Frames processed faster are not shown, processing doesn't wait for the window
+try:
+    DEBUG_DISPLAY_FPS = float(os.getenv('DEBUG_DISPLAY_FPS', '30'))
+    if DEBUG_DISPLAY_FPS <= 0:
+        raise ValueError(DEBUG_DISPLAY_FPS)
+except ValueError:
+    print('Invalid value for DEBUG_DISPLAY_FPS. It should be a positive number.')
+    ENVS_READY = False
+
 # Color of heads up display
 try:
     HUD_COLOR = ast.literal_eval(os.getenv('HUD_COLOR', '(255, 0, 0)'))
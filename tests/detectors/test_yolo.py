@@ -0,0 +1,56 @@
+'''
+Test YOLO output decoding.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import cv2
+import numpy as np
+from detectors.yolo import decode_outputs
+
+
+CLASSES = {0: 'person', 1: 'car', 2: 'bus', 3: 'dog'}
+CLASSES_OF_INTEREST = ('car', 'bus')
+
+def _reference_decode(outputs, width, height, conf_threshold, nms_threshold):
+    # row by row decoding
+    classes, confidences, boxes = [], [], []
+    for output in outputs:
+        for detection in output:
+            scores = detection[5:]
+            class_id = np.argmax(scores)
+            confidence = scores[class_id]
+            if confidence > conf_threshold and CLASSES[class_id] in CLASSES_OF_INTEREST:
+                center_x = int(detection[0] * width)
+                center_y = int(detection[1] * height)
+                w = int(detection[2] * width)
+                h = int(detection[3] * height)
+                classes.append(CLASSES[class_id])
+                confidences.append(float(confidence))
+                boxes.append([center_x - w / 2, center_y - h / 2, w, h])
+    indices = np.array(cv2.dnn.NMSBoxes(boxes, confidences, conf_threshold, nms_threshold)).flatten()
+    return [boxes[i] for i in indices], [classes[i] for i in indices], [confidences[i] for i in indices]
+
+def _random_outputs(seed):
+    rng = np.random.RandomState(seed)
+    outputs = []
+    for rows in (300, 1200):
+        output = rng.uniform(0, 1, (rows, 5 + len(CLASSES))).astype(np.float32)
+        output[:, 2:4] *= 0.2
+        outputs.append(output)
+    return outputs
+
+def test_decode_outputs_is_unchanged():
+    class_names = np.array([CLASSES[i] for i in range(len(CLASSES))])
+    mask = np.isin(class_names, CLASSES_OF_INTEREST)
+    for seed in range(5):
+        outputs = _random_outputs(seed)
+        result = decode_outputs(outputs, 1280, 720, class_names, mask, 0.9, 0.4)
+        assert result == _reference_decode(outputs, 1280, 720, 0.9, 0.4)
+        assert len(result[0]) > 0, 'some objects are detected'
+
+def test_decode_outputs_without_detections():
+    class_names = np.array([CLASSES[i] for i in range(len(CLASSES))])
+    mask = np.isin(class_names, CLASSES_OF_INTEREST)
+    outputs = [np.zeros((10, 5 + len(CLASSES)), dtype=np.float32)]
+    assert decode_outputs(outputs, 1280, 720, class_names, mask, 0.5, 0.4) == ([], [], [])
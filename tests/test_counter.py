@@ -0,0 +1,92 @@
+'''
+Test counting functions.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import copy
+import random
+import settings # pylint: disable=unused-import # settings must be loaded before counter
+from util.blob import Blob
+from counter import attempt_count, attempt_count_batch, recount, get_cross_mode_lines
+from util.trajectory import TrajectoryWriter, load_trajectories
+
+
+COUNTING_LINES = [
+    {'label': 'A', 'line': [(100, 0), (100, 300)]},
+    {'label': 'B', 'line': [(0, 150), (300, 150)], 'lookfor': 'bottom', 'direction': 'left'},
+    {'label': 'C', 'line': [(200, 300), (200, 0)], 'lookfor': 'cc', 'direction': 'right'},
+    {'label': 'D', 'line': [(50, 50), (250, 250)], 'lookfor': 'corners', 'direction': 'left', 'dir_measurement': 'previous'},
+    {'label': 'E', 'line': [(0, 250), (300, 250)], 'lookfor': 'box', 'direction': 'right', 'dir_measurement': 'previous'},
+    {'label': 'F', 'line': [(150, 0), (150, 300)], 'lookfor': 'tr', 'mindist': 40},
+    {'label': 'G', 'line': [(0, 100), (300, 100)], 'lookfor': 'top', 'direction': 'right'},
+]
+
+def _random_blobs(rng, size):
+    blobs = {}
+    for n in range(size):
+        box = [rng.randint(0, 250), rng.randint(0, 250), rng.randint(5, 50), rng.randint(5, 50)]
+        blobs['obj_{}'.format(n)] = Blob(box, rng.choice(['car', 'bus']), 0.9, None)
+    return blobs
+
+def _move_blobs(rng, blobs):
+    for blob in blobs.values():
+        if rng.random() < 0.1:
+            continue # blob not updated in this frame
+        x, y, w, h = blob.bounding_box
+        blob.update((x + rng.uniform(-15, 15), y + rng.uniform(-15, 15), w, h))
+
+def test_batch_counting_is_unchanged():
+    rng = random.Random(0)
+    blobs = _random_blobs(rng, 80)
+    batch_blobs = copy.deepcopy(blobs)
+    counts = {line['label']: {} for line in COUNTING_LINES}
+    batch_counts = copy.deepcopy(counts)
+
+    for _ in range(30):
+        for blob_id, blob in blobs.items():
+            attempt_count(blob, blob_id, COUNTING_LINES, counts)
+        attempt_count_batch(batch_blobs, COUNTING_LINES, batch_counts)
+        for blob_id in blobs:
+            assert blobs[blob_id].lines_crossed == batch_blobs[blob_id].lines_crossed
+        state = rng.getstate()
+        _move_blobs(rng, blobs)
+        rng.setstate(state)
+        _move_blobs(rng, batch_blobs)
+
+    assert batch_counts == counts
+    assert sum(sum(c.values()) for c in counts.values()) > 0, 'some objects have been counted'
+
+def test_batch_counting_without_blobs():
+    counts = {line['label']: {} for line in COUNTING_LINES}
+    assert attempt_count_batch({}, COUNTING_LINES, counts) == ({}, counts)
+
+def test_recount_from_trajectories(tmp_path):
+    rng = random.Random(1)
+    blobs = _random_blobs(rng, 60)
+    counts = {line['label']: {} for line in COUNTING_LINES}
+    path = str(tmp_path / 'trajectories.npz')
+    writer = TrajectoryWriter(path, chunk_size=100)
+    for frame_number in range(30):
+        writer.add(frame_number, blobs)
+        attempt_count_batch(blobs, COUNTING_LINES, counts)
+        _move_blobs(rng, blobs)
+        if frame_number == 10:
+            # objects leave and enter the scene
+            for blob_id in list(blobs)[:10]:
+                del blobs[blob_id]
+            blobs.update({'new_' + blob_id: blob for blob_id, blob in _random_blobs(rng, 10).items()})
+    writer.save(video='video.mp4')
+
+    trajectories = load_trajectories(path)
+    assert trajectories['metadata'] == {'video': 'video.mp4'}
+    recounts, events = recount(trajectories, COUNTING_LINES)
+    assert recounts == counts, 'recount gives the same counts as processing'
+    assert len(events) == sum(sum(c.values()) for c in counts.values())
+    assert [e['counted_at_frame'] for e in events] == sorted(e['counted_at_frame'] for e in events)
+
+def test_cross_mode_lines():
+    lines = get_cross_mode_lines(COUNTING_LINES)
+    assert [line.get('lookfor') for line in lines] == ['corners', 'cc', 'cc', 'corners', 'corners', 'tr', 'cc']
+    assert lines[1]['direction'] == 'left'
+    assert 'lookfor' not in COUNTING_LINES[0], 'counting lines are copied'
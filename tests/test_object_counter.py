@@ -0,0 +1,76 @@
+'''
+Test object counter.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import threading
+import numpy as np
+import settings # pylint: disable=unused-import # settings must be loaded before ObjectCounter
+from ObjectCounter import ObjectCounter
+
+
+class FakeDetectionQueue:
+    '''
+    Detector finding nothing, blocked until release() is called once async detection has started.
+    '''
+    def __init__(self):
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.calls = 0
+
+    def detect(self, frame):
+        self.calls += 1
+        if self.calls > 1: # the first detection runs synchronously in the constructor
+            self.started.set()
+            self.released.wait(5)
+        return [], [], []
+
+def _get_counter(detection_queue):
+    frame = np.zeros((60, 80, 3), dtype=np.uint8)
+    droi = [(0, 0), (80, 0), (80, 60), (0, 60)]
+    counter = ObjectCounter(frame, 'haarcascade', 'kcf', droi, False, 2, 3, 1, [], False, (255, 0, 0),
+                            tracker_threads=1, detection_queue=detection_queue, async_detection=True)
+    return counter, frame
+
+def test_close_with_running_async_detection():
+    detection_queue = FakeDetectionQueue()
+    counter, frame = _get_counter(detection_queue)
+    counter.count(frame)
+    counter.count(frame)
+    assert detection_queue.started.wait(5), 'detection runs on the worker thread'
+    future = counter.pending_detection[0]
+    threading.Timer(0.1, detection_queue.released.set).start()
+    counter.close()
+    assert future.done(), 'close waits for the running detection'
+
+def test_close_cancels_queued_async_detection():
+    detection_queue = FakeDetectionQueue()
+    counter, frame = _get_counter(detection_queue)
+    blocker = threading.Event()
+    counter.detection_executor.submit(blocker.wait, 5) # keeps the worker busy
+    counter.count(frame)
+    counter.count(frame)
+    future = counter.pending_detection[0]
+    threading.Timer(0.1, blocker.set).start()
+    counter.close()
+    assert future.cancelled(), 'detection not started yet is cancelled'
+    assert detection_queue.calls == 1
+
+class FakeBoxDetectionQueue:
+    '''
+    Detector finding the same car in every frame.
+    '''
+    def detect(self, frame):
+        return [[20, 20, 20, 16]], ['car'], [0.9]
+
+def test_grayscale_kcf_tracking():
+    frame = np.random.RandomState(0).randint(0, 256, (60, 80, 3)).astype(np.uint8)
+    droi = [(0, 0), (80, 0), (80, 60), (0, 60)]
+    counter = ObjectCounter(frame, 'haarcascade', 'kcf', droi, False, 2, 3, 10, [], False, (255, 0, 0),
+                            tracker_threads=1, detection_queue=FakeBoxDetectionQueue(), tracking_grayscale=True)
+    for _ in range(4):
+        counter.count(frame)
+    counter.close()
+    assert counter.tracking_frame.shape == (60, 80, 3)
+    assert counter.tracker_updates == 4 and counter.tracking_failures == 0, 'KCF trackers follow grayscale frames'
@@ -0,0 +1,119 @@
+'''
+Test tracker functions.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import random
+import numpy as np
+import pytest
+from util.blob import Blob
+from util.bounding_box import get_overlap, get_overlap2
+from tracker import _match_boxes_new, _get_match_scores, remove_duplicates, move_boxes, add_new_blobs
+
+
+def _reference_matches(boxes, classes, confidences, blobs):
+    # straightforward loop over all box/blob pairs
+    scores = []
+    for i, box in enumerate(boxes):
+        for _id, blob in blobs.items():
+            score = get_overlap2(box, blob.bounding_box)
+            if score < 0.4:
+                continue
+            if classes[i] != blob.type:
+                score = score / (1 + confidences[i] * blob.type_confidence)
+            if score > 0.4:
+                scores.append((score, i, _id))
+    scores.sort(reverse=True)
+    matched_boxes, matched_blobs, matches = set(), set(), []
+    for _, i, _id in scores:
+        if i not in matched_boxes and _id not in matched_blobs:
+            matches.append((i, _id))
+            matched_boxes.add(i)
+            matched_blobs.add(_id)
+    return matches
+
+def _random_scene(seed, size=40):
+    rng = random.Random(seed)
+    types = ['car', 'bus', 'truck']
+    blobs = {}
+    for n in range(size):
+        box = [rng.uniform(0, 500), rng.uniform(0, 500), rng.uniform(10, 80), rng.uniform(10, 80)]
+        blobs['obj_{}'.format(n)] = Blob(box, rng.choice(types), rng.uniform(0.3, 1), None)
+    boxes = [[b.bounding_box[0] + rng.uniform(-10, 10), b.bounding_box[1] + rng.uniform(-10, 10),
+              b.bounding_box[2], b.bounding_box[3]] for b in blobs.values()]
+    boxes += [[rng.uniform(0, 500), rng.uniform(0, 500), 40, 40] for _ in range(size // 2)]
+    classes = [rng.choice(types) for _ in boxes]
+    confidences = [rng.uniform(0.3, 1) for _ in boxes]
+    return boxes, classes, confidences, blobs
+
+def test_greedy_matching_is_unchanged():
+    for seed in range(10):
+        boxes, classes, confidences, blobs = _random_scene(seed)
+        assert _match_boxes_new(boxes, classes, confidences, blobs) == \
+            _reference_matches(boxes, classes, confidences, blobs)
+
+def test_matching_without_boxes_or_blobs():
+    boxes, classes, confidences, blobs = _random_scene(0)
+    assert _match_boxes_new([], [], [], blobs) == []
+    assert _match_boxes_new(boxes, classes, confidences, {}) == []
+
+def test_hungarian_matching():
+    pytest.importorskip('scipy')
+    boxes, classes, confidences, blobs = _random_scene(1)
+    greedy = _match_boxes_new(boxes, classes, confidences, blobs)
+    hungarian = _match_boxes_new(boxes, classes, confidences, blobs, 'hungarian')
+    assert len({i for i, _ in hungarian}) == len(hungarian), 'each box is matched at most once'
+    assert len({_id for _, _id in hungarian}) == len(hungarian), 'each blob is matched at most once'
+    scores = _get_match_scores(boxes, classes, confidences, blobs)
+    blob_index = {_id: j for j, _id in enumerate(blobs)}
+    total_score = lambda matches: sum(scores[i, blob_index[_id]] for i, _id in matches)
+    assert total_score(hungarian) >= total_score(greedy), 'hungarian matching maximizes the total score'
+
+def _reference_remove_duplicates(blobs):
+    for blob_id, blob_a in list(blobs.items()):
+        for _, blob_b in list(blobs.items()):
+            if blob_a == blob_b:
+                break
+            if get_overlap(blob_a.bounding_box, blob_b.bounding_box) >= 0.6 and blob_id in blobs:
+                del blobs[blob_id]
+    return blobs
+
+def test_remove_duplicates_is_unchanged():
+    for seed in range(10):
+        blobs = _random_scene(seed, size=150)[3]
+        expected = list(_reference_remove_duplicates(dict(blobs)))
+        assert list(remove_duplicates(dict(blobs))) == expected
+
+def test_remove_duplicates_keeps_first_blob():
+    blobs = {
+        'a': Blob([0, 0, 10, 10], 'car', 0.9, None),
+        'b': Blob([1, 1, 10, 10], 'car', 0.9, None),
+        'c': Blob([2, 2, 10, 10], 'car', 0.9, None),
+        'd': Blob([50, 50, 10, 10], 'car', 0.9, None),
+    }
+    assert list(remove_duplicates(blobs)) == ['a', 'd']
+
+def test_move_boxes():
+    old_bboxes = [[0, 0, 10, 10], [100, 100, 20, 20]]
+    new_bboxes = [[5, 2, 10, 10], [90.6, 100, 20, 20]]
+    boxes = [[1, 1, 10, 10], [102, 98, 20, 20], [300, 300, 5, 5]]
+    assert move_boxes(boxes, old_bboxes, new_bboxes) == [[6, 3, 10, 10], [93, 98, 20, 20], [300, 300, 5, 5]]
+    assert move_boxes(boxes, [], []) == boxes
+
+def test_lazy_tracker_reinit():
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    kept, drifted, retyped = object(), object(), object()
+    blobs = {
+        'a': Blob([10, 10, 20, 20], 'car', 0.9, kept),
+        'b': Blob([50, 10, 20, 20], 'car', 0.9, drifted),
+        'c': Blob([10, 60, 20, 20], 'car', 0.9, retyped),
+    }
+    stats = {'tracker_reinits': 0, 'tracker_reinits_skipped': 0}
+    boxes = [[11, 10, 20, 20], [56, 10, 20, 20], [10, 60, 20, 20]]
+    blobs = add_new_blobs(boxes, ['car', 'car', 'truck'], [0.9] * 3, blobs, frame, 'kcf', 2, reinit_overlap=0.8, stats=stats)
+    assert blobs['a'].tracker is kept
+    assert blobs['b'].tracker is not drifted
+    assert blobs['c'].tracker is not retyped
+    assert stats == {'tracker_reinits': 2, 'tracker_reinits_skipped': 1}
+    assert blobs['a'].bounding_box == [11, 10, 20, 20]
@@ -31,3 +31,10 @@ def test_blob_update():
     assert blob.type == _new_type
     assert blob.type_confidence == _new_confidence
     assert blob.tracker == _new_tracker
+
+def test_blob_update_scaled():
+    blob = Blob([10, 10, 20, 20], 'car', 0.99, None)
+    blob.update((5, 6, 10, 10), scale=0.5)
+
+    assert blob.bounding_box == (10, 12, 20, 20)
+    assert blob.centroid == (20, 22)
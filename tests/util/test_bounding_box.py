@@ -1,4 +1,4 @@
-from util.bounding_box import get_centroid, box_contains_point, get_area
+from util.bounding_box import get_centroid, box_contains_point, get_area, get_overlap2, get_overlap2_matrix
 
 
 def test_get_centroid():
@@ -21,4 +21,13 @@ def test_box_contains_point():
 def test_get_area():
     bounding_box = [1, 1, 4, 4]
     area = get_area(bounding_box)
-    assert area == 16, 'area of box [1, 1, 4, 4] is 16'
\ No newline at end of file
+    assert area == 16, 'area of box [1, 1, 4, 4] is 16'
+
+def test_get_overlap2_matrix():
+    bboxes1 = [[1, 1, 4, 4], [10, 10, 2, 2], [0, 0, 3, 6]]
+    bboxes2 = [[2, 2, 4, 4], [20, 20, 1, 1]]
+    matrix = get_overlap2_matrix(bboxes1, bboxes2)
+    assert matrix.shape == (3, 2), 'one row per box of the first list, one column per box of the second'
+    for i, bbox1 in enumerate(bboxes1):
+        for j, bbox2 in enumerate(bboxes2):
+            assert abs(matrix[i, j] - get_overlap2(bbox1, bbox2)) < 1e-9, 'same overlap as get_overlap2'
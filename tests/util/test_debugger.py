@@ -13,3 +13,11 @@ def test_capture_pixel_position(caplog):
     caplog.set_level(logging.INFO)
     capture_pixel_position(640, 360, 1920, 1080)
     assert caplog.records[-1].meta['position'] == (960, 540), 'correct pixel position is logged'
+
+def test_capture_pixel_position_in_transformed_frame(caplog):
+    # pylint: disable=missing-function-docstring
+    settings.DEBUG_WINDOW_SIZE = (1280, 720)
+    caplog.set_level(logging.INFO)
+    # frame of the bottom half of a 1920x1080 video, at half scale
+    capture_pixel_position(640, 360, 960, 270, {'scale': 0.5, 'crop': [0, 540, 1920, 540]})
+    assert caplog.records[-1].meta['position'] == (960, 810), 'position is logged in video coordinates'
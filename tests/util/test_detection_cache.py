@@ -0,0 +1,60 @@
+'''
+Test detection cache.
+'''
+
+# pylint: disable=missing-function-docstring
+
+from concurrent.futures import ProcessPoolExecutor
+from util.detection_cache import DetectionCache, get_video_hash, get_cache_key
+
+
+def test_cache_roundtrip(tmp_path):
+    path = str(tmp_path / 'cache.npz')
+    cache = DetectionCache(path)
+    assert cache.get(10) is None, 'empty cache has no detections'
+    cache.put(10, [[1, 2, 3, 4], [5.5, 6, 7, 8]], ['car', 'bus'], [0.9, 0.8])
+    cache.put(20, [], [], [])
+    cache.put(30, [[1, 1, 2, 2]], None, None)
+    cache.save()
+
+    cache = DetectionCache(path)
+    assert cache.get(10) == ([[1, 2, 3, 4], [5.5, 6, 7, 8]], ['car', 'bus'], [0.9, 0.8])
+    assert cache.get(20) == ([], [], [])
+    assert cache.get(30) == ([[1, 1, 2, 2]], None, None), 'detectors without classes are supported'
+    assert cache.get(40) is None
+    assert cache.get_stats() == {'hits': 3, 'misses': 1}
+
+def test_cache_save_keeps_other_frames(tmp_path):
+    path = str(tmp_path / 'cache.npz')
+    cache_a = DetectionCache(path)
+    cache_b = DetectionCache(path)
+    cache_a.put(1, [[1, 2, 3, 4]], ['car'], [0.9])
+    cache_b.put(2, [[1, 2, 3, 4]], ['bus'], [0.7])
+    cache_a.save()
+    cache_b.save()
+    cache = DetectionCache(path)
+    assert cache.get(1) is not None and cache.get(2) is not None, 'frames saved by both caches are kept'
+
+def _save_frames(path, frames):
+    cache = DetectionCache(path)
+    for frame_number in frames:
+        cache.put(frame_number, [[1, 2, 3, 4]], ['car'], [0.9])
+        cache.save()
+
+def test_concurrent_saves(tmp_path):
+    path = str(tmp_path / 'cache.npz')
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_save_frames, [path] * 4, [range(i, 40, 4) for i in range(4)]))
+    cache = DetectionCache(path)
+    assert sorted(cache.detections) == list(range(40)), 'frames saved by concurrent runs are all kept'
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['cache.npz', 'cache.npz.lock'], 'no temporary file is left'
+
+def test_cache_key(tmp_path):
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(b'0123456789' * 1000)
+    video_hash = get_video_hash(str(video))
+    assert video_hash == get_video_hash(str(video))
+    assert get_video_hash(str(tmp_path / 'missing.mp4')) is None, 'streams have no hash'
+    key = get_cache_key(video_hash, 'yolo', {'YOLO_CONFIDENCE_THRESHOLD': 0.5})
+    assert key == get_cache_key(video_hash, 'yolo', {'YOLO_CONFIDENCE_THRESHOLD': 0.5})
+    assert key != get_cache_key(video_hash, 'yolo', {'YOLO_CONFIDENCE_THRESHOLD': 0.6})
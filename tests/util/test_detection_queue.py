@@ -0,0 +1,31 @@
+'''
+Test detection requests shared by several streams.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+import settings # pylint: disable=unused-import # settings must be loaded before detectors
+from detectors import detector
+from util.detection_queue import DetectionQueue
+
+
+class _Detector:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def get_bounding_boxes_batch(self, frames):
+        self.batch_sizes.append(len(frames))
+        return [([[int(frame[0, 0]), 0, 1, 1]], ['car'], [0.9]) for frame in frames]
+
+def test_requests_are_batched(monkeypatch):
+    fake_detector = _Detector()
+    monkeypatch.setitem(detector._detectors, 'fake', fake_detector)
+    detection_queue = DetectionQueue('fake', max_batch_size=4, max_wait=0.5)
+    futures = [detection_queue.submit(np.full((2, 2), n, dtype=np.uint8)) for n in range(6)]
+    detection_queue.stop()
+
+    assert [future.result()[0] for future in futures] == [[[n, 0, 1, 1]] for n in range(6)]
+    assert sum(fake_detector.batch_sizes) == 6
+    assert max(fake_detector.batch_sizes) == 4
+    assert detection_queue.get_stats()['frames'] == 6
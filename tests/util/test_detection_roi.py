@@ -0,0 +1,42 @@
+'''
+Test detection ROI utilities.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import cv2
+import numpy as np
+from util.detection_roi import get_roi_frame, get_roi_bounds, draw_roi
+
+
+POLYGON = [(20, 10), (60, 12), (70, 50), (10, 45)]
+
+def _frame():
+    return np.random.RandomState(0).randint(1, 256, (80, 100, 3)).astype(np.uint8)
+
+def test_get_roi_frame():
+    frame = _frame()
+    roi_frame = get_roi_frame(frame, POLYGON)
+    assert roi_frame.shape == frame.shape
+    assert (roi_frame[30, 40] == frame[30, 40]).all(), 'pixels inside the polygon are kept'
+    assert (roi_frame[70, 90] == 0).all(), 'pixels outside the polygon are blacked out'
+    assert (get_roi_frame(frame, POLYGON) == roi_frame).all(), 'cached mask gives the same result'
+
+def test_get_roi_bounds():
+    assert get_roi_bounds(POLYGON, (80, 100, 3)) == (10, 10, 61, 41)
+    assert get_roi_bounds([(-5, -5), (200, 0), (0, 200)], (80, 100, 3)) == (0, 0, 100, 80), 'bounds are clipped to the frame'
+
+def test_get_cropped_roi_frame():
+    frame = _frame()
+    x, y, w, h = get_roi_bounds(POLYGON, frame.shape)
+    cropped = get_roi_frame(frame, POLYGON, crop=True)
+    assert cropped.shape == (h, w, 3)
+    assert (cropped == get_roi_frame(frame, POLYGON)[y:y + h, x:x + w]).all(), 'cropped frame matches the full frame'
+
+def test_draw_roi():
+    frame = _frame()
+    # tint of the whole frame blended with a filled polygon
+    overlay = frame.copy()
+    cv2.fillPoly(overlay, np.array([POLYGON], dtype=np.int32), (0, 255, 255))
+    expected = cv2.addWeighted(overlay, 0.3, frame, 0.7, 0)
+    assert (draw_roi(frame, POLYGON) == expected).all(), 'only the bounding rectangle is blended, with the same result'
@@ -0,0 +1,56 @@
+'''
+Test debug display.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import time
+import numpy as np
+import settings # pylint: disable=unused-import # settings must be loaded before util.logger
+from util import display as display_module
+from util.display import DebugDisplay
+
+
+class FakeHighGUI:
+    '''
+    Window functions of OpenCV, recording the frames shown.
+    '''
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.shown = []
+        self.destroyed = False
+
+    def install(self, monkeypatch):
+        monkeypatch.setattr(display_module.cv2, 'namedWindow', lambda name: None)
+        monkeypatch.setattr(display_module.cv2, 'setMouseCallback', lambda name, callback, param: None)
+        monkeypatch.setattr(display_module.cv2, 'imshow', lambda name, frame: self.shown.append(frame))
+        monkeypatch.setattr(display_module.cv2, 'waitKey', self.wait_key)
+        monkeypatch.setattr(display_module.cv2, 'destroyWindow', lambda name: setattr(self, 'destroyed', True))
+
+    def wait_key(self, delay):
+        time.sleep(delay / 1000)
+        return self.keys.pop(0) if self.keys else -1
+
+def test_frames_are_rate_limited(monkeypatch):
+    gui = FakeHighGUI([])
+    gui.install(monkeypatch)
+    display = DebugDisplay((16, 12), (32, 24), max_fps=5)
+    frame = np.zeros((24, 32, 3), dtype=np.uint8)
+    assert display.show(frame)
+    assert not display.show(frame), 'frames shown within 1 / max_fps seconds are dropped'
+    time.sleep(0.3)
+    display.close()
+    assert gui.destroyed
+    assert len(gui.shown) == 1
+    assert gui.shown[0].shape == (12, 16, 3), 'frames are resized to the window size'
+    assert display.get_stats() == {'frames_shown': 1, 'frames_dropped': 1}
+
+def test_keys_are_queued(monkeypatch):
+    gui = FakeHighGUI([ord('p'), -1, ord('q')])
+    gui.install(monkeypatch)
+    display = DebugDisplay((16, 12), (32, 24), max_fps=100)
+    time.sleep(0.1)
+    display.close()
+    assert display.get_key() == ord('p')
+    assert display.get_key() == ord('q')
+    assert display.get_key() is None
@@ -0,0 +1,139 @@
+'''
+Test ffmpeg frame source.
+'''
+
+# pylint: disable=missing-function-docstring,redefined-outer-name
+
+import io
+import shutil
+import cv2
+import numpy as np
+import pytest
+import settings # pylint: disable=unused-import # settings must be loaded before util.logger
+from util import frame_source as frame_source_module
+from util.frame_source import FFmpegFrameSource, get_frame_source, transform_points, inverse_transform_points
+
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is not installed')
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / 'video.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(10):
+        # the frame number is encoded in the brightness of the frame
+        writer.write(np.full((48, 64, 3), i * 20, dtype=np.uint8))
+    writer.release()
+    return path
+
+class FakeFFmpeg:
+    '''
+    ffmpeg process writing frames filled with their frame number, following the seek and framestep of its command.
+    '''
+    def __init__(self, command, num_frames=10, fps=10, **kwargs): # pylint: disable=unused-argument
+        self.command = command
+        first_frame = round(float(command[command.index('-ss') + 1]) * fps) if '-ss' in command else 0
+        filters = command[command.index('-vf') + 1]
+        step = int(filters.split(',')[0].split('=')[1]) if filters.startswith('framestep') else 1
+        size = tuple(int(v) for v in filters.split('crop=')[1].split(',')[0].split(':')[:2])
+        if 'scale=' in filters:
+            size = tuple(int(v) for v in filters.split('scale=')[1].split(':'))
+        frame_size = size[0] * size[1] * 3
+        self.stdout = io.BytesIO(b''.join(bytes([i]) * frame_size for i in range(first_frame, num_frames, step)))
+
+    def kill(self):
+        pass
+
+    def wait(self):
+        pass
+
+def _fake_source(monkeypatch, video, **kwargs):
+    processes = []
+    def popen(command, **popen_kwargs):
+        processes.append(FakeFFmpeg(command, **popen_kwargs))
+        return processes[-1]
+    monkeypatch.setattr(frame_source_module.subprocess, 'Popen', popen)
+    return FFmpegFrameSource(video, **kwargs), processes
+
+def test_read_with_frame_step(monkeypatch, video):
+    source, _ = _fake_source(monkeypatch, video, scale=0.5, frame_step=3, num_buffers=2)
+    frames = []
+    retval, frame = source.read()
+    while retval:
+        assert frame.shape == (24, 32, 3)
+        frames.append(int(frame[0, 0, 0]))
+        assert source.get(cv2.CAP_PROP_POS_FRAMES) == 3 * len(frames), 'position follows the frames skipped by ffmpeg'
+        retval, frame = source.read()
+    assert frames == [0, 3, 6, 9]
+
+def test_buffers_are_reused(monkeypatch, video):
+    source, _ = _fake_source(monkeypatch, video, num_buffers=2)
+    first = source.read()[1]
+    second = source.read()[1]
+    third = source.read()[1]
+    assert first is third and first is not second, 'frames are read into num_buffers arrays in turn'
+    assert int(third[0, 0, 0]) == 2
+
+def test_grab_and_seek(monkeypatch, video):
+    source, processes = _fake_source(monkeypatch, video)
+    assert source.grab()
+    assert int(source.read()[1][0, 0, 0]) == 1, 'grabbed frames are skipped'
+    assert source.set(cv2.CAP_PROP_POS_FRAMES, 7)
+    assert '-ss' in processes[-1].command, 'ffmpeg is restarted at the new position'
+    assert source.get(cv2.CAP_PROP_POS_FRAMES) == 7
+    assert int(source.read()[1][0, 0, 0]) == 7
+    assert source.grab() and source.grab()
+    assert source.read() == (False, None), 'nothing is read past the end of the video'
+
+def test_command_filters(video):
+    source = FFmpegFrameSource(video, scale=0.5, crop=(8, 0, 32, 48), frame_step=2)
+    command = source._get_command() # pylint: disable=protected-access
+    source.release()
+    assert command[command.index('-vf') + 1] == 'framestep=2,crop=32:48:8:0,scale=16:24'
+    assert source.get(cv2.CAP_PROP_FRAME_WIDTH) == 16
+    assert source.get(cv2.CAP_PROP_FRAME_HEIGHT) == 24
+
+def test_transform_points(video):
+    source = FFmpegFrameSource(video, scale=0.5, crop=(8, 4, 32, 40))
+    source.release()
+    assert source.transform_points([(8, 4), (40, 44)]) == [(0, 0), (16, 20)]
+
+def test_inverse_transform_points():
+    points = [(8, 4), (40, 44)]
+    transformed = transform_points(points, scale=0.5, crop=[8, 4, 32, 40])
+    assert inverse_transform_points(transformed, scale=0.5, crop=[8, 4, 32, 40]) == points
+
+def test_missing_ffmpeg(video):
+    source = get_frame_source(video, 'ffmpeg', ffmpeg_path='/nonexistent/ffmpeg')
+    assert not source.isOpened()
+
+@requires_ffmpeg
+def test_frames_are_read(video):
+    source = get_frame_source(video, 'ffmpeg', scale=0.5, frame_step=3)
+    frames = []
+    retval, frame = source.read()
+    while retval:
+        frames.append(int(frame.mean() / 20 + 0.5))
+        retval, frame = source.read()
+    source.release()
+    assert frame is None
+    assert frames == [0, 3, 6, 9], 'every third frame is read'
+    assert source.get(cv2.CAP_PROP_POS_FRAMES) == 12
+
+@requires_ffmpeg
+def test_seek(video):
+    source = get_frame_source(video, 'ffmpeg')
+    source.set(cv2.CAP_PROP_POS_FRAMES, 5)
+    assert source.grab()
+    retval, frame = source.read()
+    source.release()
+    assert retval
+    assert frame.shape == (48, 64, 3)
+    assert int(frame.mean() / 20 + 0.5) == 6
+
+def test_seek_with_frame_step(monkeypatch, video):
+    # sharded runs seek to the start of their segment before reading every frame_step-th frame
+    source, _ = _fake_source(monkeypatch, video, frame_step=2)
+    source.set(cv2.CAP_PROP_POS_FRAMES, 5)
+    assert [int(source.read()[1][0, 0, 0]) for _ in range(3)] == [5, 7, 9]
+    assert source.get(cv2.CAP_PROP_POS_FRAMES) == 11
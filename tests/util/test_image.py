@@ -0,0 +1,29 @@
+'''
+Test image utilities.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import cv2
+import numpy as np
+import settings # pylint: disable=unused-import # settings must be loaded before util.logger
+from util.image import StaticOverlay
+
+
+def _draw(frame, color):
+    cv2.line(frame, (10, 10), (90, 70), color, 3)
+    cv2.putText(frame, 'A', (20, 60), cv2.FONT_HERSHEY_DUPLEX, 1, color, 2)
+
+def test_static_overlay():
+    frame = np.random.RandomState(0).randint(0, 256, (80, 100, 3)).astype(np.uint8)
+    expected = frame.copy()
+    _draw(expected, (0, 255, 255))
+    overlay = StaticOverlay(frame.shape, (0, 255, 255), _draw)
+    assert (overlay.apply(frame) == expected).all(), 'blending the overlay gives the same result as drawing'
+
+def test_static_overlay_antialiasing():
+    frame = np.zeros((40, 40, 3), dtype=np.uint8)
+    overlay = StaticOverlay(frame.shape, (0, 0, 200), lambda f, c: cv2.line(f, (0, 0), (39, 25), c, 1, cv2.LINE_AA))
+    red = overlay.apply(frame)[:, :, 2]
+    assert 0 < red.max() <= 200
+    assert ((red > 0) & (red < 200)).any(), 'edge pixels are partly blended'
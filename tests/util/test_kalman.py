@@ -0,0 +1,31 @@
+'''
+Test Kalman filters of the 'sort' tracker.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+from util.kalman import KalmanBank
+
+
+def test_filters_follow_constant_velocity():
+    bank = KalmanBank(capacity=1)
+    # moving right by 5 pixels per frame and static
+    moving, static = bank.add([0, 0, 10, 10]), bank.add([50, 50, 20, 20])
+    for frame_number in range(1, 10):
+        bank.predict()
+        bank.correct([moving.slot, static.slot], [[5 * frame_number, 0, 10, 10], [50, 50, 20, 20]])
+    for frame_number in range(10, 13):
+        bank.predict()
+    assert np.allclose(moving.get_box(), [60, 0, 10, 10], atol=1)
+    assert np.allclose(static.get_box(), [50, 50, 20, 20], atol=1e-6)
+
+def test_slots_are_reused():
+    bank = KalmanBank(capacity=2)
+    tracks = [bank.add([n, n, 10, 10]) for n in range(3)]
+    assert [track.slot for track in tracks] == [0, 1, 2]
+    bank.release_unused([tracks[2].slot])
+    track = bank.add([100, 100, 10, 10])
+    assert track.slot == 0
+    assert track.get_box() == [100, 100, 10, 10]
+    assert tracks[2].get_box() == [2, 2, 10, 10]
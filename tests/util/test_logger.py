@@ -1,7 +1,7 @@
 import logging
 from unittest.mock import patch
 from dotenv import load_dotenv
-from util.logger import init_logger, get_logger
+from util.logger import init_logger, get_logger, BufferedFileHandler
 
 
 load_dotenv()
@@ -18,3 +18,12 @@ def test_init_logger():
 def test_get_logger():
     logger = get_logger()
     assert logger == logging.getLogger('job_123'), 'logger instance is retrieved'
+
+def test_buffered_file_handler(tmp_path):
+    path = tmp_path / 'test.log'
+    handler = BufferedFileHandler(str(path), flush_interval=60, flush_records=3)
+    for i in range(4):
+        handler.handle(logging.makeLogRecord({'msg': str(i)}))
+    assert path.read_text() == '0\n1\n2\n', 'records are written in batches'
+    handler.close()
+    assert path.read_text() == '0\n1\n2\n3\n', 'records left are written on close'
@@ -0,0 +1,42 @@
+'''
+Test motion gating of detections.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import numpy as np
+import pytest
+from util.motion import MotionGate
+
+
+DROI = [(0, 0), (200, 0), (200, 100), (0, 100)]
+
+def _frame(x=None):
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    if x is not None:
+        frame[40:60, x:x + 20] = 255
+    return frame
+
+def test_static_scene_is_skipped():
+    motion_gate = MotionGate('diff', DROI, (100, 200, 3), max_skips=2)
+    # the first check has nothing to compare with
+    assert motion_gate.should_detect(_frame(), False)
+    assert not motion_gate.should_detect(_frame(), False)
+    assert not motion_gate.should_detect(_frame(), False)
+    # too many skips in a row
+    assert motion_gate.should_detect(_frame(), False)
+    # tracked objects
+    assert motion_gate.should_detect(_frame(), True)
+    assert motion_gate.get_stats() == {'checks': 5, 'skips': 2}
+
+@pytest.mark.parametrize('method', ['diff', 'mog2'])
+def test_moving_object_is_detected(method):
+    motion_gate = MotionGate(method, DROI, (100, 200, 3))
+    for _ in range(5):
+        motion_gate.should_detect(_frame(), False)
+    assert motion_gate.get_motion(_frame(80)) > 0.01
+
+def test_motion_outside_roi_is_ignored():
+    motion_gate = MotionGate('diff', [(0, 0), (100, 0), (100, 100), (0, 100)], (100, 200, 3))
+    motion_gate.get_motion(_frame())
+    assert motion_gate.get_motion(_frame(150)) == 0
@@ -0,0 +1,68 @@
+'''
+Test frame prefetcher.
+'''
+
+# pylint: disable=missing-function-docstring,missing-class-docstring
+
+import pytest
+from util.prefetch import FramePrefetcher
+
+
+class FakeCapture:
+    def __init__(self, num_frames):
+        self.frames = list(range(num_frames))
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+def test_frames_are_read_in_order():
+    prefetcher = FramePrefetcher(FakeCapture(20), queue_size=3)
+    frames = []
+    retval, frame, _ = prefetcher.read()
+    while retval:
+        frames.append(frame)
+        retval, frame, _ = prefetcher.read()
+    prefetcher.stop()
+    assert frames == list(range(20)), 'all frames are returned in decoding order'
+
+def test_frames_are_prepared():
+    prefetcher = FramePrefetcher(FakeCapture(3), prepare=lambda f: f * 10)
+    assert prefetcher.read() == (True, 0, 0)
+    assert prefetcher.read() == (True, 1, 10)
+    prefetcher.stop()
+
+def test_stop_before_end():
+    prefetcher = FramePrefetcher(FakeCapture(100), queue_size=2)
+    prefetcher.read()
+    prefetcher.stop()
+    assert not prefetcher.thread.is_alive(), 'producer thread has ended'
+    assert prefetcher.read() == (False, None, None), 'nothing is read after stop'
+
+def test_producer_error_is_raised():
+    def prepare(frame):
+        raise ValueError(frame)
+    prefetcher = FramePrefetcher(FakeCapture(3), prepare=prepare)
+    with pytest.raises(ValueError):
+        prefetcher.read()
+    prefetcher.stop()
+
+class FakeGrabCapture(FakeCapture):
+    def __init__(self, num_frames):
+        super().__init__(num_frames)
+        self.grabbed = 0
+
+    def grab(self):
+        if not self.frames:
+            return False
+        self.grabbed += 1
+        self.frames.pop(0)
+        return True
+
+def test_frames_are_strided():
+    cap = FakeGrabCapture(10)
+    prefetcher = FramePrefetcher(cap, stride=3)
+    assert [prefetcher.read()[1] for _ in range(4)] == [2, 5, 8, None]
+    prefetcher.stop()
+    assert cap.grabbed == 7, 'skipped frames are only grabbed'
@@ -0,0 +1,39 @@
+'''
+Test video recorder.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import cv2
+import numpy as np
+import settings # pylint: disable=unused-import # settings must be loaded before util.logger
+from util.recorder import VideoRecorder
+
+
+def count_frames(path):
+    cap = cv2.VideoCapture(path)
+    num_frames = 0
+    while cap.read()[0]:
+        num_frames += 1
+    cap.release()
+    return num_frames
+
+def test_full_recording(tmp_path):
+    path = str(tmp_path / 'output.avi')
+    recorder = VideoRecorder(path, 10, (32, 24))
+    for i in range(12):
+        recorder.write(np.zeros((24, 32, 3), dtype=np.uint8), i)
+    recorder.close()
+    assert recorder.get_stats() == {'frames_written': 12, 'clips': 0}
+    assert count_frames(path) == 12
+
+def test_event_clips(tmp_path):
+    path = str(tmp_path / 'output.avi')
+    recorder = VideoRecorder(path, 10, (32, 24), mode='events', clip_before=3, clip_after=2)
+    for i in range(30):
+        # events 10 and 12 share a clip
+        recorder.write(np.zeros((24, 32, 3), dtype=np.uint8), i, event=i in (10, 12, 25))
+    recorder.close()
+    assert recorder.get_stats() == {'frames_written': 14, 'clips': 2}
+    assert count_frames(str(tmp_path / 'output_10.avi')) == 8, 'frames 7 to 14 are recorded'
+    assert count_frames(str(tmp_path / 'output_25.avi')) == 6, 'frames 22 to 27 are recorded'
@@ -0,0 +1,43 @@
+'''
+Test the adaptive detection interval.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import logging
+import settings # pylint: disable=unused-import # settings must be loaded before util.logger
+from util.scheduler import DetectionScheduler
+
+
+def test_interval_follows_activity():
+    scheduler = DetectionScheduler((0, 0, 100, 100), 10, 2, 16)
+    # nothing tracked
+    assert scheduler.update([], 0, 0.0) == 16
+    assert scheduler.update([], 0, 0.0) == 16
+    # a new object
+    assert scheduler.update([[40, 40, 10, 10]], 1, 0.0) == 8
+    # tracked objects away from the edges
+    assert scheduler.update([[40, 40, 10, 10]], 0, 0.0) == 9
+    # an object near an edge
+    assert scheduler.update([[40, 40, 10, 10], [92, 40, 6, 6]], 0, 0.0) == 4
+    # trackers failing
+    assert scheduler.update([[40, 40, 10, 10]], 0, 0.5) == 2
+    assert scheduler.update([[40, 40, 10, 10]], 0, 0.5) == 2
+
+def test_initial_interval_is_bounded():
+    assert DetectionScheduler((0, 0, 100, 100), 50, 2, 16).interval == 16
+
+def test_decisions_are_logged(caplog):
+    scheduler = DetectionScheduler((0, 0, 100, 100), 10, 2, 16)
+    caplog.set_level(logging.DEBUG)
+    scheduler.update([[40, 40, 10, 10]], 1, 0.0)
+    scheduler.update([], 0, 0.0)
+    scheduler.update([], 0, 0.0)
+    decisions = [r.meta for r in caplog.records if r.meta['label'] == 'DETECTION_INTERVAL_DECISION']
+    updates = [r.meta for r in caplog.records if r.meta['label'] == 'DETECTION_INTERVAL_UPDATE']
+    assert [(m['reason'], m['interval']) for m in decisions] == [('active', 5), ('idle', 10), ('idle', 16)]
+    assert decisions[0]['new_blobs'] == 1 and decisions[0]['blobs'] == 1 and decisions[0]['tracking_failure_rate'] == 0.0
+    assert len(updates) == 3, 'changes of interval are logged at INFO'
+    caplog.clear()
+    scheduler.update([], 0, 0.0)
+    assert [r.levelno for r in caplog.records] == [logging.DEBUG], 'unchanged interval is only logged at DEBUG'
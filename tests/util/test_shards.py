@@ -0,0 +1,31 @@
+'''
+Test splitting videos into segments and merging their counts.
+'''
+
+# pylint: disable=missing-function-docstring
+
+from util.shards import get_shards, merge_count_events
+
+
+COUNTING_LINES = [{'label': 'A', 'line': [(0, 0), (0, 10)]}, {'label': 'B', 'line': [(10, 0), (10, 10)]}]
+
+def _event(frame_number, line='A', _type='car'):
+    return {'counting_line': line, 'type': _type, 'counted_at_frame': frame_number}
+
+def test_get_shards():
+    assert get_shards(0, 100, 3, 10) == [(0, 0, 33), (23, 33, 66), (56, 66, 100)]
+    assert get_shards(50, 60, 1, 10) == [(50, 50, 60)]
+    # no more segments than frames
+    assert get_shards(0, 2, 4, 1) == [(0, 0, 1), (0, 1, 2)]
+
+def test_merge_count_events():
+    shards = get_shards(0, 100, 2, 20)
+    shard_events = [
+        [_event(10), _event(45, 'B'), _event(48)],
+        # 35 and 45 are counted during the overlap, 52 is the car counted at 48 by the first shard,
+        # 53 is another object and 90 is well past the overlap
+        [_event(35), _event(45, 'B'), _event(52), _event(53, _type='bus'), _event(90)],
+    ]
+    counts, events = merge_count_events(shard_events, shards, COUNTING_LINES, 5)
+    assert counts == {'A': {'car': 3, 'bus': 1}, 'B': {'car': 1}}
+    assert [event['counted_at_frame'] for event in events] == [10, 45, 48, 53, 90]
@@ -0,0 +1,53 @@
+'''
+Test trajectory export.
+'''
+
+# pylint: disable=missing-function-docstring
+
+import os
+import numpy as np
+import settings # pylint: disable=unused-import # settings must be loaded before util.logger
+from util.blob import Blob
+from util.trajectory import TrajectoryWriter, load_trajectories
+
+
+def _write(path, num_frames):
+    writer = TrajectoryWriter(path, chunk_size=4)
+    blobs = {'a': Blob([0, 0, 10, 10], 'car', 0.9, None)}
+    for frame_number in range(num_frames):
+        if frame_number == 3:
+            blobs['b'] = Blob([20, 20, 10, 10], 'truck', None, None)
+        writer.add(frame_number, blobs)
+    return writer
+
+def test_chunks_are_written_as_they_fill(tmp_path):
+    path = str(tmp_path / 'trajectories.npz')
+    writer = _write(path, 7)
+    # 11 rows: 2 chunks are written (after frames 3 and 5), the rows of frame 6 are still buffered
+    assert sorted(os.listdir(writer.parts_path)) == ['000000.npz', '000001.npz']
+    assert len(writer.rows['frames']) == 2
+    writer.save(video='video.mp4')
+    assert not os.path.exists(writer.parts_path), 'parts are removed once merged'
+    trajectories = load_trajectories(path)
+    assert trajectories['frames'].tolist() == [0, 1, 2, 3, 3, 4, 4, 5, 5, 6, 6]
+    assert trajectories['object_ids'].tolist() == ['a', 'b']
+    assert trajectories['first_positions'].shape == (2, 2)
+    assert trajectories['type_names'].tolist() == ['car', 'truck']
+    assert trajectories['types'].tolist() == [0, 0, 0, 0, 1, 0, 1, 0, 1, 0, 1]
+    assert np.isnan(trajectories['confidences'][-1])
+    assert trajectories['metadata'] == {'video': 'video.mp4'}
+
+def test_parts_of_interrupted_run(tmp_path):
+    path = str(tmp_path / 'trajectories.npz')
+    writer = _write(path, 6)
+    trajectories = load_trajectories(writer.parts_path)
+    assert trajectories['frames'].tolist() == [0, 1, 2, 3, 3, 4, 4, 5, 5]
+    assert trajectories['object_ids'].tolist() == ['a', 'b']
+    assert trajectories['metadata'] == {}
+
+def test_save_without_rows(tmp_path):
+    path = str(tmp_path / 'trajectories.npz')
+    TrajectoryWriter(path).save()
+    trajectories = load_trajectories(path)
+    assert trajectories['frames'].size == 0
+    assert trajectories['boxes'].shape == (0, 4)
@@ -0,0 +1,29 @@
+'''
+Test worker pool.
+'''
+
+# pylint: disable=missing-function-docstring
+
+from util.worker_pool import WorkerPool
+
+
+def test_serial_map():
+    pool = WorkerPool(4, min_parallel_items=8)
+    assert pool.map(lambda x: x * 2, range(5)) == [0, 2, 4, 6, 8]
+    stats = pool.get_stats()
+    assert stats['serial_calls'] == 1 and stats['parallel_calls'] == 0, 'short lists are processed serially'
+    pool.shutdown()
+
+def test_parallel_map_keeps_order():
+    pool = WorkerPool(3, min_parallel_items=2)
+    assert pool.map(lambda x: x * 2, range(100)) == [x * 2 for x in range(100)]
+    stats = pool.get_stats()
+    assert stats['parallel_calls'] == 1, 'long lists are processed by the pool'
+    assert 0 <= stats['utilisation'] <= 1
+    pool.shutdown()
+
+def test_single_worker_is_serial():
+    pool = WorkerPool(1, min_parallel_items=1)
+    assert pool.map(str, [1, 2]) == ['1', '2']
+    assert pool.get_stats()['parallel_calls'] == 0, 'a single worker never uses threads'
+    pool.shutdown()
@@ -2,11 +2,15 @@
 Functions for keeping track of detected objects in a video.
 '''
 
+# pylint: disable=import-outside-toplevel
+
 import sys
+import logging
 import cv2
+import numpy as np
 import settings
 from util.blob import Blob
-from util.bounding_box import get_overlap, get_overlap2, get_box_image
+from util.bounding_box import get_overlap, get_overlap2, get_overlaps, get_overlap2_matrix, get_box_image
 from util.image import get_base64_image
 from util.object_info import generate_object_id
 from util.logger import get_logger
@@ -30,16 +34,19 @@ def _kcf_create(bounding_box, frame):
 	tracker.init(frame, tuple(bounding_box))
 	return tracker
 
-def get_tracker(algorithm, bounding_box, frame):
+def get_tracker(algorithm, bounding_box, frame, tracker_bank=None):
 	'''
 	Fetch a tracker object based on the algorithm specified.
+	'sort' trackers are Kalman filters stored in tracker_bank (see util.kalman.KalmanBank).
 	'''
 	if algorithm == 'csrt':
 		return _csrt_create(bounding_box, frame)
 	if algorithm == 'kcf':
 		return _kcf_create(bounding_box, frame)
+	if algorithm == 'sort':
+		return tracker_bank.add(bounding_box)
 
-	logger.error('Invalid tracking algorithm specified (options: csrt, kcf)', extra={
+	logger.error('Invalid tracking algorithm specified (options: csrt, kcf, sort)', extra={
 		'meta': {'label': 'INVALID_TRACKING_ALGORITHM'},
 	})
 	sys.exit()
@@ -68,117 +75,245 @@ def _match_boxes_simple(boxes,classes, confidences, blobs):
 				matches.append((i,_id))
 	return matches
 
-def _match_boxes_new(boxes,classes, confidences, blobs):
+def _get_match_scores(boxes, classes, confidences, blobs):
+	'''
+	Compute the matching score of every box (rows) with every blob (columns).
+	The score is the overlap of box and blob, lowered when their classes differ.
+	Pairs that can't be matched have a score of 0.
+	'''
+	blobs_list = list(blobs.values())
+	overlaps = get_overlap2_matrix(boxes, [blob.bounding_box for blob in blobs_list])
+	if overlaps.size == 0:
+		return overlaps
+
+	# encode classes as integers so they can be compared as arrays
+	class_codes = {}
+	box_classes = np.array([class_codes.setdefault(c, len(class_codes)) for c in classes]) \
+				  if classes is not None \
+				  else np.full(len(overlaps), class_codes.setdefault(None, 0))
+	blob_classes = np.array([class_codes.setdefault(blob.type, len(class_codes)) for blob in blobs_list])
+	box_confidences = np.array([c if c is not None else 0.0 for c in confidences], dtype=np.float64) \
+					  if confidences is not None \
+					  else np.zeros(len(overlaps))
+	blob_confidences = np.array([blob.type_confidence if blob.type_confidence is not None else 0.0 for blob in blobs_list],
+								dtype=np.float64)
+
+	penalties = np.where(box_classes[:, np.newaxis] != blob_classes[np.newaxis, :],
+						 1 + box_confidences[:, np.newaxis] * blob_confidences[np.newaxis, :],
+						 1.0)
+	scores = overlaps / penalties
+	return np.where((overlaps >= 0.4) & (scores > 0.4), scores, 0.0)
+
+def _match_boxes_new(boxes,classes, confidences, blobs, algorithm='greedy'):
 	'''
 	match boxes with existing blobs
+	algorithm can be 'greedy' (best scores are matched first) or 'hungarian' (best total score)
 	'''
-	scores=[]
-	for i, box in enumerate(boxes):
-		for _id, blob in blobs.items():
-			score=get_overlap2(box, blob.bounding_box)
-			if score<0.4:
-				continue
-			if classes[i]!=blob.type:
-				score=score/(1+confidences[i]*blob.type_confidence)
-			if score>0.4:
-				scores.append((score,i,_id))
-	scores.sort(reverse=True)
-	blobs_to_match={_id:True for _id in blobs}
-	boxes_to_match=[True]*len(boxes)
+	blob_ids = list(blobs.keys())
+	scores = _get_match_scores(boxes, classes, confidences, blobs)
+	if scores.size == 0:
+		return []
+
+	if algorithm == 'hungarian':
+		from scipy.optimize import linear_sum_assignment
+		rows, cols = linear_sum_assignment(scores, maximize=True)
+		return [(int(i), blob_ids[j]) for i, j in zip(rows, cols) if scores[i, j] > 0]
+
+	candidates = np.flatnonzero(scores)
+	candidates = candidates[np.argsort(-scores.flat[candidates], kind='stable')]
+	boxes_to_match = np.ones(scores.shape[0], dtype=bool)
+	blobs_to_match = np.ones(scores.shape[1], dtype=bool)
 	matches=[]
-	for _,i,_id in scores:
-		if boxes_to_match[i] and blobs_to_match[_id]:
-			matches.append((i,_id))
+	for i, j in zip(*np.unravel_index(candidates, scores.shape)):
+		if boxes_to_match[i] and blobs_to_match[j]:
+			matches.append((int(i), blob_ids[j]))
 			boxes_to_match[i]=False
-			blobs_to_match[_id]=False
-		else:
+			blobs_to_match[j]=False
+		elif logger.isEnabledFor(logging.DEBUG):
 			match_debug_log_meta = {
 				'label': 'match_debug',
-				'object_id': _id,
-				'index':i
+				'object_id': blob_ids[j],
+				'index': int(i)
 			}
-			logger.debug('Already matched.', extra={'meta': match_debug_log_meta})	
+			logger.debug('Already matched.', extra={'meta': match_debug_log_meta})
 	return matches
 
-def add_new_blobs(boxes, classes, confidences, blobs, frame, tracker, mcdf):
+def move_boxes(boxes, old_bboxes, new_bboxes):
+	'''
+	Move boxes detected on an earlier frame to where their objects are in the current frame.
+	Each box is shifted by the displacement of the blob it overlaps the most,
+	from old_bboxes (blob positions in the detected frame) to new_bboxes (current blob positions).
+	Boxes that don't overlap any blob are returned unchanged.
+	'''
+	if len(boxes) == 0 or len(old_bboxes) == 0:
+		return list(boxes)
+	overlaps = get_overlap2_matrix(boxes, old_bboxes)
+	nearest = overlaps.argmax(axis=1)
+	# shift by whole pixels, some trackers need integer coordinates
+	displacements = np.rint(np.asarray(new_bboxes, dtype=np.float64)[:, :2] - np.asarray(old_bboxes, dtype=np.float64)[:, :2])
+	moved_boxes = []
+	for i, box in enumerate(boxes):
+		if overlaps[i, nearest[i]] > 0:
+			dx, dy = displacements[nearest[i]].astype(int).tolist()
+			box = [box[0] + dx, box[1] + dy, box[2], box[3]]
+		moved_boxes.append(box)
+	return moved_boxes
+
+def _get_scaled_box(box, scale):
+	'''
+	Bounding box in a frame resized by scale. Trackers need integer coordinates.
+	'''
+	if scale == 1.0:
+		return box
+	return [int(round(v * scale)) for v in box]
+
+def add_new_blobs(boxes, classes, confidences, blobs, frame, tracker, mcdf, tracker_bank=None, reinit_overlap=None, stats=None,
+				  tracking_frame=None, tracking_scale=1.0):
 	'''
 	Add new blobs or updates existing ones.
+	tracker_bank holds the Kalman filters of 'sort' trackers, the filters of matched blobs are corrected
+	with their boxes instead of being replaced.
+	If reinit_overlap is set, the tracker of a matched blob is only replaced if the overlap (get_overlap2)
+	of its box and the detected box is below reinit_overlap or if the type of the object changed.
+	The number of trackers replaced and kept is added to stats['tracker_reinits'] and stats['tracker_reinits_skipped'].
+	If trackers run on a resized (and/or grayscale) copy of frame, it's passed as tracking_frame and tracking_scale is its scale.
 	'''
-	matches=_match_boxes_new(boxes,classes, confidences, blobs)
+	if tracking_frame is None:
+		tracking_frame, tracking_scale = frame, 1.0
+	matches=_match_boxes_new(boxes,classes, confidences, blobs, settings.MATCHING_ALGORITHM)
 	box2blob_matches={m[0]:m[1] for m in matches}
 	#box2blob_matches={m[1]:m[0] for m in matches} 
 	matched_blob_ids = set([m[1] for m in matches])
+	if tracker == 'sort':
+		matched = [(blobs[_id].tracker.slot, boxes[i]) for i, _id in box2blob_matches.items()]
+		tracker_bank.correct([slot for slot, _ in matched], [box for _, box in matched])
 	for i, box in enumerate(boxes):
 		_type = classes[i] if classes is not None else None
 		_confidence = confidences[i] if confidences is not None else None
-		_tracker = get_tracker(tracker, box, frame)
 
 		if i in box2blob_matches: # or use try catch?
 			_id=box2blob_matches[i]
 			blob=blobs[_id]
 			blob.num_consecutive_detection_failures = 0
+
+			if tracker == 'sort':
+				_tracker = None # keep the corrected filter
+			elif reinit_overlap is not None and _type in (None, blob.type) \
+					and get_overlap2(box, blob.bounding_box) >= reinit_overlap:
+				_tracker = None # the tracker still follows the object
+				if stats is not None:
+					stats['tracker_reinits_skipped'] += 1
+			else:
+				_tracker = get_tracker(tracker, _get_scaled_box(box, tracking_scale), tracking_frame, tracker_bank)
+				if stats is not None:
+					stats['tracker_reinits'] += 1
 			
 			blob.update(box, _type, _confidence, _tracker)
 
-			blob_update_log_meta = {
-				'label': 'BLOB_UPDATE',
-				'object_id': _id,
-				'bounding_box': blob.bounding_box,
-				'type': blob.type,
-				'type_confidence': blob.type_confidence,
-			}
-			if settings.LOG_IMAGES:
-				blob_update_log_meta['image'] = get_base64_image(get_box_image(frame, blob.bounding_box))
-			logger.debug('Blob updated.', extra={'meta': blob_update_log_meta})
+			# meta is only built when debug records are logged
+			if logger.isEnabledFor(logging.DEBUG):
+				blob_update_log_meta = {
+					'label': 'BLOB_UPDATE',
+					'object_id': _id,
+					'bounding_box': blob.bounding_box,
+					'type': blob.type,
+					'type_confidence': blob.type_confidence,
+				}
+				if settings.LOG_IMAGES:
+					blob_update_log_meta['image'] = get_base64_image(get_box_image(frame, blob.bounding_box))
+				logger.debug('Blob updated.', extra={'meta': blob_update_log_meta})
 
 		else: # not match_found for this box
+			_tracker = get_tracker(tracker, _get_scaled_box(box, tracking_scale), tracking_frame, tracker_bank)
 			_blob = Blob(box, _type, _confidence, _tracker)
 			blob_id = generate_object_id()
 			blobs[blob_id] = _blob
 
-			blog_create_log_meta = {
-				'label': 'BLOB_CREATE',
-				'object_id': blob_id,
-				'bounding_box': _blob.bounding_box,
-				'type': _blob.type,
-				'type_confidence': _blob.type_confidence,
-			}
-			if settings.LOG_IMAGES:
-				blog_create_log_meta['image'] = get_base64_image(get_box_image(frame, _blob.bounding_box))
-			logger.debug('Blob created.', extra={'meta': blog_create_log_meta})
+			if logger.isEnabledFor(logging.DEBUG):
+				blog_create_log_meta = {
+					'label': 'BLOB_CREATE',
+					'object_id': blob_id,
+					'bounding_box': _blob.bounding_box,
+					'type': _blob.type,
+					'type_confidence': _blob.type_confidence,
+				}
+				if settings.LOG_IMAGES:
+					blog_create_log_meta['image'] = get_base64_image(get_box_image(frame, _blob.bounding_box))
+				logger.debug('Blob created.', extra={'meta': blog_create_log_meta})
 
 	blobs = _remove_stray_blobs(blobs, matched_blob_ids, mcdf)
 	return blobs
 
+def _find_duplicates(bboxes):
+	'''
+	Find the indices of boxes that overlap (get_overlap >= 0.6) an earlier box that is not itself a duplicate.
+	Candidate pairs come from a sweep over the boxes sorted by their left edge,
+	so only boxes whose horizontal extents intersect are compared.
+	'''
+	bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+	num_boxes = len(bboxes)
+	order = np.argsort(bboxes[:, 0], kind='stable')
+	left = bboxes[order, 0]
+	right = left + bboxes[order, 2]
+
+	# box k (in sorted order) is paired with boxes k+1 ... ends[k]-1, the ones starting before its right edge
+	ends = np.searchsorted(left, right, side='left')
+	num_pairs = np.maximum(ends - np.arange(num_boxes) - 1, 0)
+	first = np.repeat(np.arange(num_boxes), num_pairs)
+	second = first + 1 + np.arange(num_pairs.sum()) - np.repeat(np.cumsum(num_pairs) - num_pairs, num_pairs)
+	first, second = order[first], order[second]
+
+	overlapping = get_overlaps(bboxes[first], bboxes[second]) >= 0.6
+	earlier = np.minimum(first, second)[overlapping]
+	later = np.maximum(first, second)[overlapping]
+
+	# boxes are kept in order, a box is dropped only if it overlaps a box that has been kept
+	overlapped_by = {}
+	for i, j in zip(later.tolist(), earlier.tolist()):
+		overlapped_by.setdefault(i, []).append(j)
+	duplicates = set()
+	for i in sorted(overlapped_by):
+		if any(j not in duplicates for j in overlapped_by[i]):
+			duplicates.add(i)
+	return duplicates
+
 def remove_duplicates(blobs):
 	'''
 	Remove duplicate blobs i.e blobs that point to an already detected and tracked object.
 	'''
-	for blob_id, blob_a in list(blobs.items()):
-		for _, blob_b in list(blobs.items()):
-			if blob_a == blob_b:
-				break
+	blob_ids = list(blobs.keys())
+	duplicates = _find_duplicates([blob.bounding_box for blob in blobs.values()])
+	for i in duplicates:
+		del blobs[blob_ids[i]]
 
-			if get_overlap(blob_a.bounding_box, blob_b.bounding_box) >= 0.6 and blob_id in blobs:
-				del blobs[blob_id]
+	if duplicates:
+		logger.debug('Duplicate blobs removed.', extra={
+			'meta': {
+				'label': 'DUPLICATES_REMOVE',
+				'object_ids': [blob_ids[i] for i in sorted(duplicates)],
+				'count': len(duplicates),
+			},
+		})
 	return blobs
 
-def update_blob_tracker(blob, blob_id, frame):
+def update_blob_tracker(blob, blob_id, frame, scale=1.0):
 	'''
 	Update a blob's tracker object.
+	scale is the scale of frame relative to the video's frames.
 	'''
 	success, box = blob.tracker.update(frame)
 	if success:
 		blob.num_consecutive_tracking_failures = 0
-		blob.update(box)
-		logger.debug('Object tracker updated.', extra={
-			'meta': {
-				'label': 'TRACKER_UPDATE',
-				'object_id': blob_id,
-				'bounding_box': blob.bounding_box,
-				'centroid': blob.centroid,
-			},
-		})
+		blob.update(box, scale=scale)
+		if logger.isEnabledFor(logging.DEBUG):
+			logger.debug('Object tracker updated.', extra={
+				'meta': {
+					'label': 'TRACKER_UPDATE',
+					'object_id': blob_id,
+					'bounding_box': blob.bounding_box,
+					'centroid': blob.centroid,
+				},
+			})
 	else:
 		blob.num_consecutive_tracking_failures += 1
 
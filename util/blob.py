@@ -18,8 +18,13 @@ class Blob:
         self.position_first_detected = tuple(self.centroid)
         self.old_bounding_box=None
 
-    def update(self, _bounding_box, _type=None, _confidence=None, _tracker=None):
+    def update(self, _bounding_box, _type=None, _confidence=None, _tracker=None, scale=1.0):
+        '''
+        scale is the scale of the frame _bounding_box was found in, relative to the video's frames.
+        '''
         #self.old_bounding_box=self.bounding_box
+        if scale != 1.0:
+            _bounding_box = tuple(v / scale for v in _bounding_box)
         self.bounding_box = _bounding_box
         self.type = _type if _type is not None else self.type
         self.type_confidence = _confidence if _confidence is not None else self.type_confidence
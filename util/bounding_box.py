@@ -2,6 +2,8 @@
 Bounding box utility functions.
 '''
 
+import numpy as np
+
 def get_centroid(bbox):
 	'''
 	Calculates the center point of a bounding box.
@@ -83,6 +85,55 @@ def get_overlap2(bbox1, bbox2):
 	overlap = overlap_area / dividing_area
 	return overlap
 	
+def get_overlap_areas(bboxes1, bboxes2):
+	'''
+	Vectorized version of get_overlap_area.
+	bboxes1 and bboxes2 are arrays of boxes of shape (..., 4) that are broadcast against each other.
+	'''
+	bboxes1 = np.asarray(bboxes1, dtype=np.float64)
+	bboxes2 = np.asarray(bboxes2, dtype=np.float64)
+
+	overlap_width = np.minimum(bboxes1[..., 0] + bboxes1[..., 2], bboxes2[..., 0] + bboxes2[..., 2]) - \
+					np.maximum(bboxes1[..., 0], bboxes2[..., 0])
+	overlap_height = np.minimum(bboxes1[..., 1] + bboxes1[..., 3], bboxes2[..., 1] + bboxes2[..., 3]) - \
+					 np.maximum(bboxes1[..., 1], bboxes2[..., 1])
+
+	return np.where((overlap_width < 0) | (overlap_height < 0), 0.0, overlap_width * overlap_height)
+
+def get_overlaps(bboxes1, bboxes2):
+	'''
+	Vectorized version of get_overlap.
+	bboxes1 and bboxes2 are arrays of boxes of shape (..., 4) that are broadcast against each other.
+	'''
+	bboxes1 = np.asarray(bboxes1, dtype=np.float64)
+	bboxes2 = np.asarray(bboxes2, dtype=np.float64)
+
+	overlap_areas = get_overlap_areas(bboxes1, bboxes2)
+	smaller_areas = np.minimum(bboxes1[..., 2] * bboxes1[..., 3], bboxes2[..., 2] * bboxes2[..., 3])
+
+	epsilon = 1e-5 # small value to prevent division by zero
+	with np.errstate(divide='ignore', invalid='ignore'):
+		overlaps = overlap_areas / (smaller_areas + epsilon)
+	return np.where(overlap_areas == 0, 0.0, overlaps)
+
+def get_overlap2_matrix(bboxes1, bboxes2):
+	'''
+	Calculates get_overlap2 for every pair of boxes of two lists.
+	Returns a matrix with a row for every box in bboxes1 and a column for every box in bboxes2.
+	'''
+	bboxes1 = np.asarray(bboxes1, dtype=np.float64).reshape(-1, 4)
+	bboxes2 = np.asarray(bboxes2, dtype=np.float64).reshape(-1, 4)
+
+	overlap_areas = get_overlap_areas(bboxes1[:, np.newaxis, :], bboxes2[np.newaxis, :, :])
+	bboxes1_areas = bboxes1[:, 2] * bboxes1[:, 3]
+	bboxes2_areas = bboxes2[:, 2] * bboxes2[:, 3]
+	dividing_areas = (bboxes1_areas[:, np.newaxis] + bboxes2_areas[np.newaxis, :]) / 2
+
+	# boxes with no area do not overlap anything
+	with np.errstate(divide='ignore', invalid='ignore'):
+		overlaps = overlap_areas / dividing_areas
+	return np.where(dividing_areas > 0, overlaps, 0.0)
+
 def get_box_image(frame, bbox):
 	'''
 	Fetches the image of the area covered by a bounding box.
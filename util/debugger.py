@@ -6,6 +6,7 @@ import cv2
 
 from .logger import get_logger
 import settings
+from .frame_source import inverse_transform_points
 
 
 logger = get_logger()
@@ -15,13 +16,17 @@ def mouse_callback(event, x, y, flags, param):
     Handler for mouse events in the debug window.
     '''
     if event == cv2.EVENT_LBUTTONDOWN:
-        capture_pixel_position(x, y, param['frame_width'], param['frame_height'])
+        capture_pixel_position(x, y, param['frame_width'], param['frame_height'], param.get('frame_transform'))
 
-def capture_pixel_position(window_x, window_y, frame_w, frame_h):
+def capture_pixel_position(window_x, window_y, frame_w, frame_h, frame_transform=None):
     '''
     Capture the position of a pixel in a video frame.
+    frame_transform is the scale and crop of the frames shown (see util.frame_source.transform_points),
+    positions are logged in the coordinates of the video, as used by DROI and COUNTING_LINES.
     '''
     debug_window_size = settings.DEBUG_WINDOW_SIZE
     x = round((frame_w / debug_window_size[0]) * window_x)
     y = round((frame_h / debug_window_size[1]) * window_y)
+    if frame_transform is not None:
+        (x, y), = inverse_transform_points([(x, y)], **frame_transform)
     logger.info('Pixel position captured.', extra={'meta': {'label': 'PIXEL_POSITION', 'position': (x, y)}})
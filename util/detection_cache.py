@@ -0,0 +1,169 @@
+'''
+On-disk cache of detector outputs.
+'''
+
+import os
+import json
+import hashlib
+import pathlib
+import tempfile
+import contextlib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+
+def get_video_hash(video, sample_size=1 << 20):
+    '''
+    Fingerprint a video file from its size and its first and last sample_size bytes.
+    Hashing whole videos would take longer than many of the runs the cache is meant to speed up.
+    Returns None if video isn't a file (e.g. a camera stream).
+    '''
+    if not os.path.isfile(video):
+        return None
+    size = os.path.getsize(video)
+    video_hash = hashlib.sha1(str(size).encode('utf-8'))
+    with open(video, 'rb') as video_file:
+        video_hash.update(video_file.read(sample_size))
+        video_file.seek(max(size - sample_size, 0))
+        video_hash.update(video_file.read(sample_size))
+    return video_hash.hexdigest()
+
+def get_cache_key(video_hash, detector, config):
+    '''
+    Key identifying the detector outputs of a video.
+    config holds everything else the outputs depend on (model paths, thresholds, detection ROI, ...).
+    '''
+    key = json.dumps({'video': video_hash, 'detector': detector, 'config': config}, sort_keys=True, default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+@contextlib.contextmanager
+def _lock_file(path):
+    '''
+    Hold an exclusive lock on path + '.lock', where file locks are available.
+    '''
+    with open(path + '.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _get_box(values):
+    '''
+    Bounding box as stored in the cache.
+    Detectors return integer coordinates for at least some of the values, and some trackers need them.
+    '''
+    return [int(v) if float(v).is_integer() else float(v) for v in values]
+
+class DetectionCache:
+    '''
+    Detector outputs (bounding boxes, classes and confidences) of the frames of a video, by frame number.
+    The cache is stored as a compressed npz file with the detections of all frames concatenated.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.detections = {}
+        self.new_frames = set() # frames added since the cache was loaded
+        self.hits = 0
+        self.misses = 0
+        if os.path.isfile(path):
+            self.detections = self._read()
+
+    def _read(self):
+        detections = {}
+        with np.load(self.path) as data:
+            data = {name: data[name] for name in data.files}
+        class_names = data['class_names'].tolist()
+        offsets = data['offsets']
+        for n, frame_number in enumerate(data['frames'].tolist()):
+            start, end = offsets[n], offsets[n + 1]
+            bounding_boxes = [_get_box(box) for box in data['boxes'][start:end].tolist()]
+            if data['has_classes'][n]:
+                classes = [class_names[i] for i in data['class_ids'][start:end]]
+                confidences = data['confidences'][start:end].tolist()
+            else:
+                classes, confidences = None, None
+            detections[frame_number] = (bounding_boxes, classes, confidences)
+        return detections
+
+    def get(self, frame_number):
+        '''
+        Fetch the detections of a frame, None if they are not in the cache.
+        '''
+        detections = self.detections.get(frame_number)
+        if detections is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return detections
+
+    def put(self, frame_number, bounding_boxes, classes, confidences):
+        '''
+        Add the detections of a frame.
+        '''
+        self.detections[frame_number] = (
+            [_get_box(box) for box in bounding_boxes],
+            list(classes) if classes is not None else None,
+            [float(c) for c in confidences] if confidences is not None else None,
+        )
+        self.new_frames.add(frame_number)
+
+    def save(self):
+        '''
+        Write the cache to disk, keeping frames added to the file by other runs in the meantime.
+        Runs saving the same cache at once (e.g segments of a sharded run) take turns.
+        '''
+        if not self.new_frames:
+            return
+        pathlib.Path(os.path.dirname(self.path) or '.').mkdir(parents=True, exist_ok=True)
+        with _lock_file(self.path):
+            self._save()
+
+    def _save(self):
+        detections = self._read() if os.path.isfile(self.path) else {}
+        detections.update({frame_number: self.detections[frame_number] for frame_number in self.new_frames})
+
+        frames = sorted(detections)
+        class_names = sorted({c for _, classes, _ in detections.values() if classes is not None for c in classes})
+        class_ids = {c: i for i, c in enumerate(class_names)}
+        boxes, ids, confidences, offsets, has_classes = [], [], [], [0], []
+        for frame_number in frames:
+            _boxes, _classes, _confidences = detections[frame_number]
+            boxes.extend(_boxes)
+            ids.extend([class_ids[c] for c in _classes] if _classes is not None else [-1] * len(_boxes))
+            confidences.extend(_confidences if _confidences is not None else [np.nan] * len(_boxes))
+            offsets.append(len(boxes))
+            has_classes.append(_classes is not None)
+
+        # write to a file of our own and replace the cache with it, so that readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp.npz', dir=os.path.dirname(self.path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.savez_compressed(
+                    tmp_file,
+                    frames=np.array(frames, dtype=np.int64),
+                    offsets=np.array(offsets, dtype=np.int64),
+                    boxes=np.array(boxes, dtype=np.float64).reshape(-1, 4),
+                    class_ids=np.array(ids, dtype=np.int32),
+                    confidences=np.array(confidences, dtype=np.float64),
+                    has_classes=np.array(has_classes, dtype=bool),
+                    class_names=np.array(class_names, dtype=str),
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.detections = detections
+        self.new_frames = set()
+
+    def get_stats(self):
+        '''
+        Number of cache hits and misses.
+        '''
+        return {'hits': self.hits, 'misses': self.misses}
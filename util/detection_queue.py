@@ -0,0 +1,93 @@
+'''
+Detection requests from several streams served by a single detector, in batches.
+'''
+
+import queue
+import threading
+from concurrent.futures import Future
+
+from detectors.detector import get_bounding_boxes_batch
+
+
+class DetectionQueue:
+    '''
+    Queue detection requests and run them on a background thread.
+    Requests waiting at the same time are run together with get_bounding_boxes_batch,
+    the thread waits up to max_wait seconds for a batch to fill up to max_batch_size frames.
+    '''
+    def __init__(self, model, max_batch_size=8, max_wait=0.01):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.frames = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _get_batch(self):
+        request = self.requests.get()
+        if request is None:
+            return None
+        batch = [request]
+        try:
+            while len(batch) < self.max_batch_size:
+                request = self.requests.get(timeout=self.max_wait)
+                if request is None:
+                    # finish the requests already taken before stopping
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._get_batch()
+            if batch is None:
+                return
+            batch = [(frame, future) for frame, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = get_bounding_boxes_batch([frame for frame, _ in batch], self.model)
+            except Exception as e: # pylint: disable=broad-except
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            self.batches += 1
+            self.frames += len(batch)
+
+    def submit(self, frame):
+        '''
+        Queue a frame for detection. Return a future of its (bounding boxes, classes, confidences).
+        '''
+        future = Future()
+        self.requests.put((frame, future))
+        return future
+
+    def detect(self, frame):
+        '''
+        Run detection on a frame and wait for the result.
+        '''
+        return self.submit(frame).result()
+
+    def stop(self):
+        '''
+        Serve the requests already queued and stop the background thread.
+        '''
+        self.requests.put(None)
+        self.thread.join()
+
+    def get_stats(self):
+        '''
+        Number of batches run and mean number of frames per batch.
+        '''
+        return {
+            'batches': self.batches,
+            'frames': self.frames,
+            'mean_batch_size': round(self.frames / self.batches, 2) if self.batches else 0,
+        }
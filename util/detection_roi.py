@@ -1,20 +1,63 @@
+import functools
 import numpy as np
 import cv2
 
 
-def get_roi_frame(current_frame, polygon):
-    mask = np.zeros(current_frame.shape, dtype=np.uint8)
-    polygon = np.array([polygon], dtype=np.int32)
-    num_frame_channels = current_frame.shape[2]
+def get_roi_bounds(polygon, frame_shape):
+    '''
+    Bounding rectangle (x, y, w, h) of a polygon, clipped to the frame.
+    '''
+    x, y, w, h = cv2.boundingRect(np.array(polygon, dtype=np.int32))
+    frame_h, frame_w = frame_shape[:2]
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + w, frame_w), min(y + h, frame_h)
+    return x1, y1, max(x2 - x1, 0), max(y2 - y1, 0)
+
+@functools.lru_cache(maxsize=16)
+def _get_roi_mask(frame_shape, polygon, crop):
+    '''
+    Mask of the polygon for frames of the given shape.
+    If crop is True, the mask only covers the bounding rectangle of the polygon.
+    Masks are cached since the polygon doesn't change during a run.
+    '''
+    offset = (0, 0)
+    if crop:
+        x, y, w, h = get_roi_bounds(polygon, frame_shape)
+        frame_shape = (h, w) + tuple(frame_shape[2:])
+        offset = (-x, -y)
+    mask = np.zeros(frame_shape, dtype=np.uint8)
+    num_frame_channels = frame_shape[2] if len(frame_shape) > 2 else 1
     mask_ignore_color = (255,) * num_frame_channels
-    cv2.fillPoly(mask, polygon, mask_ignore_color)
+    cv2.fillPoly(mask, np.array([polygon], dtype=np.int32), mask_ignore_color, offset=offset)
+    mask.flags.writeable = False
+    return mask
+
+def get_roi_frame(current_frame, polygon, crop=False):
+    '''
+    Black out the area of a frame outside the polygon.
+    If crop is True, the frame is also cropped to the bounding rectangle of the polygon
+    (see get_roi_bounds for the position of the cropped frame).
+    '''
+    polygon = tuple(tuple(point) for point in polygon)
+    mask = _get_roi_mask(current_frame.shape, polygon, crop)
+    if crop:
+        x, y, w, h = get_roi_bounds(polygon, current_frame.shape)
+        current_frame = current_frame[y:y + h, x:x + w]
     masked_frame = cv2.bitwise_and(current_frame, mask)
     return masked_frame
 
 def draw_roi(frame, polygon):
-    frame_overlay = frame.copy()
-    polygon = np.array([polygon], dtype=np.int32)
-    cv2.fillPoly(frame_overlay, polygon, (0, 255, 255))
+    '''
+    Tint the area of the frame inside the polygon, in place.
+    Only the bounding rectangle of the polygon is blended.
+    '''
+    polygon = tuple(tuple(point) for point in polygon)
+    x, y, w, h = get_roi_bounds(polygon, frame.shape)
+    if w == 0 or h == 0:
+        return frame
+    mask = _get_roi_mask(frame.shape[:2], polygon, True)
+    region = frame[y:y + h, x:x + w]
     alpha = 0.3
-    output_frame = cv2.addWeighted(frame_overlay, alpha, frame, 1 - alpha, 0)
-    return output_frame
\ No newline at end of file
+    tinted_region = cv2.addWeighted(np.full_like(region, (0, 255, 255)), alpha, region, 1 - alpha, 0)
+    np.copyto(region, tinted_region, where=mask[:, :, None].astype(bool))
+    return frame
@@ -0,0 +1,88 @@
+'''
+Debug window, shown on its own thread so that the counting loop doesn't wait for it.
+'''
+
+import queue
+import threading
+import time
+import cv2
+
+from .debugger import mouse_callback
+
+
+class DebugDisplay:
+    '''
+    Show the latest processed frame in a window at up to max_fps frames per second.
+    Frames are handed over through a single slot: frames shown faster than the window is refreshed are dropped.
+    Keys pressed in the window are queued for the counting loop (see get_key) and mouse events are handled
+    by mouse_callback, both from the display thread.
+    frame_size is the size of the processed frames, used to map mouse positions back to them,
+    and frame_transform their scale and crop in the video, if any (see util.frame_source.transform_points).
+    '''
+    def __init__(self, window_size, frame_size, max_fps=30, window_name='Debug', frame_transform=None):
+        self.window_size = window_size
+        self.frame_size = frame_size
+        self.frame_transform = frame_transform
+        self.interval = 1 / max_fps
+        self.window_name = window_name
+        self.frame = None # latest frame not shown yet
+        self.next_frame_time = 0
+        self.lock = threading.Lock()
+        self.keys = queue.Queue()
+        self.stopped = threading.Event()
+        self.stats = {'frames_shown': 0, 'frames_dropped': 0}
+        self.thread = threading.Thread(target=self._run, name='DebugDisplay', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        # all HighGUI calls are made from this thread
+        cv2.namedWindow(self.window_name)
+        cv2.setMouseCallback(self.window_name, mouse_callback,
+                             {'frame_width': self.frame_size[0], 'frame_height': self.frame_size[1],
+                              'frame_transform': self.frame_transform})
+        wait = max(1, int(self.interval * 1000))
+        try:
+            while not self.stopped.is_set():
+                with self.lock:
+                    frame, self.frame = self.frame, None
+                if frame is not None:
+                    cv2.imshow(self.window_name, cv2.resize(frame, self.window_size))
+                    self.stats['frames_shown'] += 1
+                key = cv2.waitKey(wait) & 0xFF
+                if key != 0xFF:
+                    self.keys.put(key)
+        finally:
+            cv2.destroyWindow(self.window_name)
+
+    def show(self, frame):
+        '''
+        Hand a frame over to the display thread, unless the previous one was shown less than 1 / max_fps seconds ago.
+        The frame is copied, it can be modified or reused by the caller afterwards.
+        '''
+        now = time.monotonic()
+        if now < self.next_frame_time:
+            self.stats['frames_dropped'] += 1
+            return False
+        self.next_frame_time = now + self.interval
+        frame = frame.copy()
+        with self.lock:
+            if self.frame is not None:
+                self.stats['frames_dropped'] += 1
+            self.frame = frame
+        return True
+
+    def get_key(self):
+        '''
+        Next key pressed in the window (as a waitKey code), None if no key was pressed.
+        '''
+        try:
+            return self.keys.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def get_stats(self):
+        return dict(self.stats)
@@ -0,0 +1,176 @@
+'''
+Sources of video frames.
+OpenCV's VideoCapture is the default source, FFmpegFrameSource decodes frames in an ffmpeg process.
+Both are used through the same methods (read, grab, get, set, isOpened, release).
+'''
+
+import subprocess
+import cv2
+import numpy as np
+
+from .logger import get_logger
+
+
+logger = get_logger()
+
+def transform_points(points, scale=1.0, crop=None):
+    '''
+    Map points from the coordinates of the video to those of its frames cropped to crop = (x, y, w, h)
+    and resized by scale.
+    '''
+    x, y = crop[:2] if crop is not None else (0, 0)
+    return [(int(round((px - x) * scale)), int(round((py - y) * scale))) for px, py in points]
+
+def inverse_transform_points(points, scale=1.0, crop=None):
+    '''
+    Map points from the coordinates of cropped and resized frames back to those of the video.
+    '''
+    x, y = crop[:2] if crop is not None else (0, 0)
+    return [(int(round(px / scale + x)), int(round(py / scale + y))) for px, py in points]
+
+class FFmpegFrameSource:
+    '''
+    Read frames decoded by an ffmpeg subprocess as raw BGR images.
+    Frames can be cropped to crop = (x, y, w, h) and resized by scale in ffmpeg, before they reach Python.
+    With frame_step > 1, ffmpeg only outputs every frame_step-th frame.
+    Frames are read into num_buffers preallocated arrays that are reused in turn:
+    a frame stays valid for num_buffers - 1 further reads, copy it to keep it longer.
+    '''
+    def __init__(self, video, scale=1.0, crop=None, frame_step=1, threads=0, num_buffers=4, ffmpeg_path='ffmpeg'):
+        self.video = video
+        self.scale = scale
+        self.frame_step = frame_step
+        self.threads = threads
+        self.ffmpeg_path = ffmpeg_path
+        self.process = None
+        self.position = 0 # number of the next frame
+
+        # probe the video with OpenCV, which is needed anyway
+        cap = cv2.VideoCapture(video)
+        self.opened = cap.isOpened()
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        source_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        source_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        if not self.opened:
+            return
+
+        self.crop = tuple(crop) if crop is not None else (0, 0, source_width, source_height)
+        self.width = max(1, int(round(self.crop[2] * scale)))
+        self.height = max(1, int(round(self.crop[3] * scale)))
+        self.buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8) for _ in range(num_buffers)]
+        self.buffer_index = 0
+        self.skip_buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self._start()
+
+    def _get_command(self):
+        filters = []
+        if self.frame_step > 1:
+            filters.append('framestep={}'.format(self.frame_step))
+        x, y, w, h = self.crop
+        filters.append('crop={}:{}:{}:{}'.format(w, h, x, y))
+        if self.scale != 1.0:
+            filters.append('scale={}:{}'.format(self.width, self.height))
+        command = [self.ffmpeg_path, '-nostdin', '-loglevel', 'error', '-threads', str(self.threads)]
+        if self.position > 0:
+            # input seeking is fast, and frame accurate since the frames are decoded
+            command += ['-ss', '{:.6f}'.format(self.position / self.fps)]
+        return command + ['-i', self.video, '-vf', ','.join(filters), '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+
+    def _start(self):
+        self._stop()
+        try:
+            self.process = subprocess.Popen(self._get_command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                            bufsize=self.width * self.height * 3)
+        except FileNotFoundError:
+            logger.error('ffmpeg not found at %s', self.ffmpeg_path, extra={
+                'meta': {'label': 'FFMPEG_NOT_FOUND'},
+            })
+            self.opened = False
+
+    def _stop(self):
+        if self.process is not None:
+            self.process.stdout.close()
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def _read_into(self, buffer):
+        if self.process is None:
+            return False
+        view = memoryview(buffer).cast('B')
+        size = 0
+        while size < len(view):
+            num_bytes = self.process.stdout.readinto(view[size:])
+            if not num_bytes:
+                return False
+            size += num_bytes
+        self.position += self.frame_step
+        return True
+
+    def isOpened(self): # pylint: disable=invalid-name
+        return self.opened
+
+    def read(self):
+        '''
+        Read the next frame. Return (retval, frame) like VideoCapture.read.
+        '''
+        buffer = self.buffers[self.buffer_index]
+        if not self._read_into(buffer):
+            return False, None
+        self.buffer_index = (self.buffer_index + 1) % len(self.buffers)
+        return True, buffer
+
+    def grab(self):
+        '''
+        Skip the next frame.
+        '''
+        return self._read_into(self.skip_buffer)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0
+
+    def set(self, prop, value):
+        '''
+        Only seeking (CAP_PROP_POS_FRAMES) is supported. The ffmpeg process is restarted at the new position.
+        '''
+        if prop != cv2.CAP_PROP_POS_FRAMES or not self.opened:
+            return False
+        self.position = int(value)
+        self._start()
+        return True
+
+    def release(self):
+        self._stop()
+
+    def get_transform(self):
+        '''
+        Scale and crop of the frames read, as keyword arguments of transform_points.
+        '''
+        return {'scale': self.scale, 'crop': list(self.crop)}
+
+    def transform_points(self, points):
+        '''
+        Map points from the coordinates of the video to those of the frames read.
+        '''
+        return transform_points(points, **self.get_transform())
+
+def get_frame_source(video, source='opencv', **kwargs):
+    '''
+    Open a video with the given source (opencv or ffmpeg).
+    kwargs are passed to FFmpegFrameSource.
+    '''
+    if source == 'ffmpeg':
+        return FFmpegFrameSource(video, **kwargs)
+    return cv2.VideoCapture(video)
@@ -1,4 +1,5 @@
 import cv2
+import numpy as np
 import base64
 import pathlib
 import uuid
@@ -22,6 +23,27 @@ def take_screenshot(frame):
         'meta': {'label': 'SCREENSHOT_CAPTURE', 'path': screenshot_path},
     })
 
+class StaticOverlay:
+    '''
+    Single color drawing that doesn't change between frames, rendered once and blended into frames.
+    draw is called with a grayscale image and the color 255 to render the drawing,
+    the intensity of its pixels is their opacity (e.g with anti-aliased lines and text).
+    '''
+    def __init__(self, frame_shape, color, draw):
+        coverage = np.zeros(frame_shape[:2], dtype=np.uint8)
+        draw(coverage, 255)
+        self.points = np.nonzero(coverage)
+        self.alpha = (coverage[self.points] / 255.0)[:, None]
+        self.color = np.array(color, dtype=np.float64)
+
+    def apply(self, frame):
+        '''
+        Blend the drawing into frame, in place. Only the pixels drawn on are updated.
+        '''
+        pixels = frame[self.points]
+        frame[self.points] = (pixels + self.alpha * (self.color - pixels) + 0.5).astype(np.uint8)
+        return frame
+
 def get_base64_image(image):
     '''
     Convert image to base 64.
@@ -0,0 +1,100 @@
+'''
+Constant velocity Kalman filters of bounding boxes, for the 'sort' tracker.
+The filters of all tracked objects are stored in arrays so that they are updated together.
+'''
+
+import numpy as np
+
+
+# state: center x, center y, width, height and their velocities; measurement: center x, center y, width, height
+_F = np.eye(8)
+_F[:4, 4:] = np.eye(4)
+_H = np.eye(4, 8)
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001, 0.0001]) # process noise
+_R = np.diag([1.0, 1.0, 10.0, 10.0]) # measurement noise
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1000.0, 1000.0, 1000.0, 1000.0]) # initial uncertainty
+
+def _to_measurements(bboxes):
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    return np.column_stack([bboxes[:, 0] + bboxes[:, 2] / 2, bboxes[:, 1] + bboxes[:, 3] / 2, bboxes[:, 2], bboxes[:, 3]])
+
+class KalmanTrack:
+    '''
+    Handle to the filter of an object in a KalmanBank, used as the tracker of a blob.
+    '''
+    def __init__(self, bank, slot):
+        self.bank = bank
+        self.slot = slot
+
+    def get_box(self):
+        return self.bank.get_boxes([self.slot])[0].tolist()
+
+class KalmanBank:
+    '''
+    Kalman filters of all the objects tracked in a video.
+    Each filter uses a slot of the state arrays, slots are reused once their object is no longer tracked.
+    '''
+    def __init__(self, capacity=64):
+        self.states = np.zeros((capacity, 8))
+        self.covariances = np.tile(_P0, (capacity, 1, 1))
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        capacity = len(self.states)
+        self.states = np.concatenate([self.states, np.zeros((capacity, 8))])
+        self.covariances = np.concatenate([self.covariances, np.tile(_P0, (capacity, 1, 1))])
+        self.active = np.concatenate([self.active, np.zeros(capacity, dtype=bool)])
+
+    def add(self, bounding_box):
+        '''
+        Start tracking an object. Return its KalmanTrack.
+        '''
+        free_slots = np.flatnonzero(~self.active)
+        if len(free_slots) == 0:
+            slot = len(self.states)
+            self._grow()
+        else:
+            slot = int(free_slots[0])
+        self.states[slot] = 0
+        self.states[slot, :4] = _to_measurements(bounding_box)[0]
+        self.covariances[slot] = _P0
+        self.active[slot] = True
+        return KalmanTrack(self, slot)
+
+    def release_unused(self, slots):
+        '''
+        Free all slots but the given ones.
+        '''
+        self.active[:] = False
+        self.active[np.asarray(slots, dtype=np.int64)] = True
+
+    def predict(self):
+        '''
+        Move all objects one frame forward.
+        '''
+        active = self.active
+        self.states[active] = self.states[active] @ _F.T
+        self.covariances[active] = _F @ self.covariances[active] @ _F.T + _Q
+
+    def correct(self, slots, bounding_boxes):
+        '''
+        Correct the filters of the given slots with detected bounding boxes.
+        '''
+        if len(slots) == 0:
+            return
+        slots = np.asarray(slots, dtype=np.int64)
+        states = self.states[slots]
+        covariances = self.covariances[slots]
+        residuals = _to_measurements(bounding_boxes) - states @ _H.T
+        residual_covariances = _H @ covariances @ _H.T + _R
+        gains = covariances @ _H.T @ np.linalg.inv(residual_covariances)
+        self.states[slots] = states + np.einsum('nij,nj->ni', gains, residuals)
+        self.covariances[slots] = (np.eye(8) - gains @ _H) @ covariances
+
+    def get_boxes(self, slots):
+        '''
+        Current bounding boxes (x, y, w, h) of the given slots, as an array.
+        '''
+        states = self.states[np.asarray(slots, dtype=np.int64)]
+        sizes = np.maximum(states[:, 2:4], 1.0)
+        return np.column_stack([states[:, :2] - sizes / 2, sizes])
@@ -3,13 +3,28 @@ VCS logger.
 '''
 
 import os
+import time
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
+import multiprocessing.util
 import pathlib
 from pythonjsonlogger import jsonlogger
 
 import settings
 from .job import get_job_id
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# log records are formatted and written by handlers on a listener thread
+_listener = None
+_listener_pid = None # process the listener thread runs in
+
 
 class MetaFilter(logging.Filter):
     '''
@@ -30,39 +45,125 @@ class CustomJsonFormatter(jsonlogger.JsonFormatter):
         log_record['logger'] = record.name
         log_record['level'] = record.levelname
 
+def _orjson_dumps(obj, default=None, **kwargs): # pylint: disable=unused-argument
+    '''
+    json.dumps compatible serializer using orjson.
+    '''
+    # objects orjson can't serialize are logged as strings, as json's default encoder does
+    return orjson.dumps(obj, default=default or str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+class BufferedFileHandler(logging.FileHandler):
+    '''
+    File handler that writes records in batches, every flush_records records or when a record is emitted
+    flush_interval seconds after the previous batch. Records left are written when the handler is closed.
+    '''
+    def __init__(self, filename, flush_interval=1.0, flush_records=1000):
+        super().__init__(filename)
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.records = []
+        self.last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            self.records.append(self.format(record) + self.terminator)
+        except Exception: # pylint: disable=broad-except
+            self.handleError(record)
+            return
+        if len(self.records) >= self.flush_records or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.records and self.stream is not None:
+                self.stream.write(''.join(self.records))
+                self.records = []
+            super().flush()
+            self.last_flush = time.monotonic()
+        finally:
+            self.release()
+
+def _start_listener(logger, handlers):
+    global _listener, _listener_pid # pylint: disable=global-statement
+    log_queue = queue.Queue()
+    for handler in logger.handlers[:]:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+
+def _restart_listener_in_child():
+    # the listener thread isn't copied to forked processes, start a new one with the same handlers
+    if _listener is not None and _listener_pid != os.getpid():
+        for handler in _listener.handlers:
+            if isinstance(handler, BufferedFileHandler):
+                handler.records = [] # written by the parent process
+        _start_listener(get_logger(), _listener.handlers)
+
+def _init_worker_process(_):
+    _restart_listener_in_child()
+    # worker processes exit without running atexit handlers, but run multiprocessing finalizers
+    multiprocessing.util.Finalize(None, stop_logger, exitpriority=100)
+
+def stop_logger():
+    '''
+    Write the log records left and stop the listener thread.
+    '''
+    global _listener # pylint: disable=global-statement
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
 def init_logger():
     '''
     Setup logger.
     '''
 
     job_id = get_job_id()
+    log_level = getattr(logging, settings.LOG_LEVEL)
 
     logger = logging.getLogger(job_id)
     logger.addFilter(MetaFilter())
-    logger.setLevel(logging.INFO)
+    logger.setLevel(log_level)
 
+    handlers = []
     enable_console_logger = settings.ENABLE_CONSOLE_LOGGER
     if enable_console_logger:
         stream_handler = logging.StreamHandler()
-        stream_handler.setLevel(logging.INFO) # https://docs.python.org/3/library/logging.html#logging-levels
+        stream_handler.setLevel(log_level) # https://docs.python.org/3/library/logging.html#logging-levels
         stream_formatter = logging.Formatter('[%(asctime)-15s] %(levelname)-8s: %(message)s %(meta)s')
         stream_handler.setFormatter(stream_formatter)
-        logger.addHandler(stream_handler)
+        handlers.append(stream_handler)
 
     enable_file_logger = settings.ENABLE_FILE_LOGGER
     if enable_file_logger:
         log_files_directory = settings.LOG_FILES_DIRECTORY
         pathlib.Path(log_files_directory).mkdir(parents=True, exist_ok=True)
         file_path = os.path.join(log_files_directory, job_id + '.log')
-        file_handler = logging.FileHandler(file_path)
-        file_handler.setLevel(logging.INFO)
+        file_handler = BufferedFileHandler(file_path)
+        file_handler.setLevel(log_level)
         #file_formatter = CustomJsonFormatter('(created) (logger) (level) (message)')
-        file_formatter = CustomJsonFormatter()
+        # orjson is optional, it serializes records several times faster than json
+        file_formatter = CustomJsonFormatter(json_serializer=_orjson_dumps if orjson is not None else json.dumps)
         file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    stop_logger()
+    if handlers:
+        _start_listener(logger, handlers)
 
 def get_logger():
     '''
     Fetch logger.
     '''
     return logging.getLogger(get_job_id())
+
+atexit.register(stop_logger)
+multiprocessing.util.register_after_fork(_restart_listener_in_child, _init_worker_process)
+if hasattr(os, 'register_at_fork'): # Python 3.7+, also covers processes not forked by multiprocessing
+    os.register_at_fork(after_in_child=_restart_listener_in_child)
@@ -0,0 +1,75 @@
+'''
+Cheap motion detection, used to skip object detection on static scenes.
+'''
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    '''
+    Measure the share of the detection ROI that changed, on downscaled grayscale frames.
+    method is 'diff' (difference with the frame of the previous check)
+    or 'mog2' (foreground of a MOG2 background model updated at every check).
+    Detection is skipped at most max_skips times in a row.
+    '''
+    def __init__(self, method, droi, frame_shape, threshold=0.002, max_skips=10, scale=0.25, pixel_threshold=25):
+        self.method = method
+        self.threshold = threshold # share of the ROI that must change for motion to be detected
+        self.max_skips = max_skips
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold # minimum intensity difference of a changed pixel in 'diff' mode
+        height, width = frame_shape[:2]
+        self.size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        self.mask = np.zeros((self.size[1], self.size[0]), dtype=np.uint8)
+        cv2.fillPoly(self.mask, (np.array([droi], dtype=np.float64) * scale).astype(np.int32), 255)
+        self.mask_area = max(1, cv2.countNonZero(self.mask))
+        self.previous_frame = None
+        self.background_subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == 'mog2' else None
+        self.checks = 0
+        self.skips = 0
+        self.consecutive_skips = 0
+
+    def get_motion(self, frame):
+        '''
+        Share of the ROI that changed in frame.
+        '''
+        small_frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small_frame.ndim == 3:
+            small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
+
+        if self.background_subtractor is not None:
+            foreground = self.background_subtractor.apply(small_frame)
+        else:
+            previous_frame, self.previous_frame = self.previous_frame, small_frame
+            if previous_frame is None:
+                return 1.0
+            _, foreground = cv2.threshold(cv2.absdiff(small_frame, previous_frame), self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(cv2.bitwise_and(foreground, self.mask)) / self.mask_area
+
+    def has_motion(self, frame):
+        '''
+        Check if enough of the ROI changed in frame.
+        '''
+        return self.get_motion(frame) >= self.threshold
+
+    def should_detect(self, frame, active):
+        '''
+        Decide whether detection should run on frame.
+        active is True when objects are being tracked, detection always runs then.
+        '''
+        self.checks += 1
+        # motion is measured even when it's not needed, to keep the reference frame or background up to date
+        motion = self.has_motion(frame)
+        if motion or active or self.consecutive_skips >= self.max_skips:
+            self.consecutive_skips = 0
+            return True
+        self.skips += 1
+        self.consecutive_skips += 1
+        return False
+
+    def get_stats(self):
+        '''
+        Number of detections checked and skipped.
+        '''
+        return {'checks': self.checks, 'skips': self.skips}
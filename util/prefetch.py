@@ -0,0 +1,87 @@
+'''
+Background frame decoding.
+'''
+
+import queue
+import threading
+
+
+def read_strided(cap, stride=1):
+    '''
+    Skip stride - 1 frames and read the next one.
+    Skipped frames are only grabbed, they are not retrieved (i.e. converted to images).
+    '''
+    for _ in range(stride - 1):
+        if not cap.grab():
+            return False, None
+    return cap.read()
+
+class FramePrefetcher:
+    '''
+    Decode frames from a video capture on a producer thread and hand them out in order.
+    Up to queue_size frames are decoded ahead of the consumer.
+    If prepare is set, it is called on every decoded frame in the producer thread
+    and its result is returned alongside the frame.
+    Only every stride-th frame is read (see read_strided).
+    '''
+    def __init__(self, cap, queue_size=8, prepare=None, stride=1):
+        self.cap = cap
+        self.prepare = prepare
+        self.stride = stride
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._produce, name='FramePrefetcher', daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        # wait for a free slot, but give up as soon as the consumer stops
+        while not self.stopped.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            while not self.stopped.is_set():
+                retval, frame = read_strided(self.cap, self.stride)
+                if not retval:
+                    break
+                prepared = self.prepare(frame) if self.prepare is not None else None
+                if not self._put((True, frame, prepared)):
+                    return
+        except Exception as error: # pylint: disable=broad-except
+            # re-raised in the consumer thread by read()
+            self.error = error
+        finally:
+            # always let the consumer know there is nothing more to read
+            self._put((False, None, None))
+
+    def read(self):
+        '''
+        Fetch the next frame.
+        Returns a (retval, frame, prepared) triple, retval is False when the video has ended.
+        '''
+        if self.stopped.is_set():
+            return False, None, None
+        retval, frame, prepared = self.frames.get()
+        if not retval:
+            self.stopped.set()
+            if self.error is not None:
+                raise self.error
+        return retval, frame, prepared
+
+    def stop(self):
+        '''
+        Stop the producer thread and discard frames decoded ahead.
+        '''
+        self.stopped.set()
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                break
+        self.thread.join()
@@ -0,0 +1,117 @@
+'''
+Recording of the processed video.
+'''
+
+import os
+import queue
+import threading
+from collections import deque
+import cv2
+
+from .logger import get_logger
+
+
+logger = get_logger()
+
+class VideoRecorder:
+    '''
+    Encode frames to a video file on a writer thread.
+    In 'full' mode every frame is recorded to path.
+    In 'events' mode only clips around events are recorded: the last clip_before frames are kept in memory
+    and, when an event occurs, written to a new file along with the clip_after frames that follow it
+    (clips of events close to each other are merged). Clips are named after path and the frame of their first event.
+    Up to queue_size frames wait to be written, write() blocks when the writer falls behind.
+    '''
+    def __init__(self, path, fps, frame_size, codec='MJPG', mode='full', clip_before=50, clip_after=75, queue_size=32):
+        self.path = path
+        self.fps = fps
+        self.frame_size = frame_size # (width, height)
+        self.fourcc = cv2.VideoWriter_fourcc(*codec)
+        self.mode = mode
+        self.clip_after = clip_after
+        self.recent_frames = deque(maxlen=max(1, clip_before))
+        self.writer = None
+        self.remaining_frames = 0 # frames left to write in the current clip
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stats = {'frames_written': 0, 'clips': 0}
+        if mode == 'full':
+            self.writer = self._open(path)
+        self.thread = threading.Thread(target=self._consume, name='VideoRecorder', daemon=True)
+        self.thread.start()
+
+    def _open(self, path):
+        writer = cv2.VideoWriter(path, self.fourcc, self.fps, self.frame_size)
+        if not writer.isOpened():
+            logger.warning('Unable to open video writer for %s', path, extra={
+                'meta': {'label': 'RECORD_WRITER_ERROR', 'path': path},
+            })
+        return writer
+
+    def _get_clip_path(self, frame_number):
+        root, ext = os.path.splitext(self.path)
+        return '{}_{}{}'.format(root, frame_number, ext)
+
+    def _close_clip(self):
+        self.writer.release()
+        self.writer = None
+        logger.info('Clip recorded.', extra={'meta': {'label': 'RECORD_CLIP', 'clips': self.stats['clips']}})
+
+    def _write(self, frame):
+        self.writer.write(frame)
+        self.stats['frames_written'] += 1
+
+    def _record_event(self, frame, frame_number):
+        if self.writer is None:
+            self.writer = self._open(self._get_clip_path(frame_number))
+            self.stats['clips'] += 1
+            for recent_frame in self.recent_frames:
+                self._write(recent_frame)
+            self.recent_frames.clear()
+        self._write(frame)
+        self.remaining_frames = self.clip_after
+
+    def _record(self, frame, frame_number, event):
+        if self.mode == 'full':
+            self._write(frame)
+        elif event:
+            self._record_event(frame, frame_number)
+        elif self.writer is not None:
+            self._write(frame)
+            self.remaining_frames -= 1
+            if self.remaining_frames <= 0:
+                self._close_clip()
+        else:
+            self.recent_frames.append(frame)
+
+    def _consume(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            try:
+                self._record(*item)
+            except cv2.error as error:
+                # keep consuming frames so that write() never blocks on a dead writer
+                logger.error('Frame not recorded: %s', error, extra={'meta': {'label': 'RECORD_ERROR'}})
+        if self.writer is not None:
+            if self.mode == 'full':
+                self.writer.release()
+            else:
+                self._close_clip()
+
+    def write(self, frame, frame_number=None, event=False):
+        '''
+        Record a frame. event marks the frames where an event (e.g an object count) occurs.
+        The frame is copied so that the caller can keep drawing on it or reuse its buffer.
+        '''
+        self.frames.put((frame.copy(), frame_number, event))
+
+    def close(self):
+        '''
+        Write the frames left and close the video file.
+        '''
+        self.frames.put(None)
+        self.thread.join()
+
+    def get_stats(self):
+        return dict(self.stats)
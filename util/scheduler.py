@@ -0,0 +1,78 @@
+'''
+Adaptive detection interval.
+'''
+
+import logging
+import numpy as np
+
+from .logger import get_logger
+
+
+logger = get_logger()
+
+class DetectionScheduler:
+    '''
+    Choose the number of frames until the next detection from the activity of the scene.
+    The interval is halved when objects enter the scene (new blobs, blobs near the edges of the detection area)
+    or trackers fail often, grows by one frame while the tracked objects stay in the scene
+    and doubles when nothing is tracked. It is kept between min_interval and max_interval.
+    '''
+    def __init__(self, bounds, initial_interval, min_interval, max_interval, edge_margin=0.05, max_failure_rate=0.2):
+        self.bounds = bounds # (x, y, w, h) of the detection area
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(initial_interval, min_interval), max_interval)
+        self.edge_margin = edge_margin # fraction of the detection area's size
+        self.max_failure_rate = max_failure_rate
+
+    def _count_edge_boxes(self, bboxes):
+        if len(bboxes) == 0:
+            return 0
+        x, y, w, h = self.bounds
+        margin_x, margin_y = w * self.edge_margin, h * self.edge_margin
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        near_edge = (bboxes[:, 0] <= x + margin_x) | (bboxes[:, 1] <= y + margin_y) | \
+            (bboxes[:, 0] + bboxes[:, 2] >= x + w - margin_x) | (bboxes[:, 1] + bboxes[:, 3] >= y + h - margin_y)
+        return int(near_edge.sum())
+
+    def _get_log_meta(self, label, interval, reason, bboxes, num_new_blobs, num_edge_blobs, tracking_failure_rate):
+        return {
+            'label': label,
+            'interval': interval,
+            'previous_interval': self.interval,
+            'reason': reason,
+            'blobs': len(bboxes),
+            'new_blobs': num_new_blobs,
+            'edge_blobs': num_edge_blobs,
+            'tracking_failure_rate': round(tracking_failure_rate, 3),
+        }
+
+    def update(self, bboxes, num_new_blobs, tracking_failure_rate):
+        '''
+        Update the interval after a detection.
+        bboxes are the bounding boxes of the blobs, num_new_blobs the number of blobs the detection created
+        and tracking_failure_rate the share of tracker updates that failed since the previous detection.
+        Return the number of frames until the next detection.
+        '''
+        num_edge_blobs = self._count_edge_boxes(bboxes)
+        if num_new_blobs > 0 or num_edge_blobs > 0 or tracking_failure_rate > self.max_failure_rate:
+            interval, reason = self.interval // 2, 'active'
+        elif len(bboxes) > 0:
+            interval, reason = self.interval + 1, 'steady'
+        else:
+            interval, reason = self.interval * 2, 'idle'
+        interval = min(max(interval, self.min_interval), self.max_interval)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            # every decision, with the signals it was made from
+            logger.debug('Detection interval chosen.', extra={
+                'meta': self._get_log_meta('DETECTION_INTERVAL_DECISION', interval, reason, bboxes,
+                                           num_new_blobs, num_edge_blobs, tracking_failure_rate),
+            })
+        if interval != self.interval:
+            logger.info('Detection interval updated.', extra={
+                'meta': self._get_log_meta('DETECTION_INTERVAL_UPDATE', interval, reason, bboxes,
+                                           num_new_blobs, num_edge_blobs, tracking_failure_rate),
+            })
+        self.interval = interval
+        return interval
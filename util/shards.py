@@ -0,0 +1,56 @@
+'''
+Split a video into time segments processed in parallel, and merge their counts.
+'''
+
+
+def get_shards(starting_frame, ending_frame, num_shards, overlap):
+    '''
+    Split frames [starting_frame, ending_frame) into num_shards segments.
+    Each segment is a (processing start, counting start, end) triple: processing starts overlap frames
+    before the segment so that objects already in view at its start are tracked by the time it begins.
+    '''
+    num_frames = ending_frame - starting_frame
+    num_shards = max(1, min(num_shards, num_frames))
+    bounds = [starting_frame + num_frames * k // num_shards for k in range(num_shards + 1)]
+    return [
+        (max(starting_frame, start - overlap), start, end)
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+def _is_duplicate(event, previous_event, tolerance):
+    return event['counting_line'] == previous_event['counting_line'] \
+        and event['type'] == previous_event['type'] \
+        and abs(event['counted_at_frame'] - previous_event['counted_at_frame']) <= tolerance
+
+def merge_count_events(shard_events, shards, counting_lines, tolerance):
+    '''
+    Merge the count events of shards (as returned by get_shards) into a single list of events and counts.
+    Events counted during the overlap of a shard belong to the previous shard and are dropped.
+    An event counted within tolerance frames after the start of a shard is dropped too if the previous shard
+    counted an object of the same type on the same line within tolerance frames of it: both shards have
+    seen the same object, but their trackers didn't register its crossing at the same frame.
+    '''
+    counts = {counting_line['label']: {} for counting_line in counting_lines}
+    merged_events = []
+    previous_events = []
+    for events, (_, counting_start, _) in zip(shard_events, shards):
+        # counts of the previous shard that may be repeated at the start of this one
+        candidates = [event for event in previous_events if event['counted_at_frame'] >= counting_start - tolerance]
+        kept_events = []
+        for event in sorted(events, key=lambda event: event['counted_at_frame']):
+            frame_number = event['counted_at_frame']
+            if frame_number < counting_start:
+                continue
+            if frame_number <= counting_start + tolerance:
+                duplicate = next((c for c in candidates if _is_duplicate(event, c, tolerance)), None)
+                if duplicate is not None:
+                    candidates.remove(duplicate)
+                    continue
+            kept_events.append(event)
+
+        for event in kept_events:
+            line_counts = counts[event['counting_line']]
+            line_counts[event['type']] = line_counts.get(event['type'], 0) + 1
+        merged_events.extend(kept_events)
+        previous_events = kept_events
+    return counts, merged_events
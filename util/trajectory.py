@@ -0,0 +1,130 @@
+'''
+Trajectories of tracked objects, stored in a columnar file so objects can be recounted offline.
+'''
+
+import os
+import glob
+import json
+import shutil
+import pathlib
+import numpy as np
+
+
+# arrays of a trajectory file without any row
+_EMPTY_ARRAYS = {
+    'object_ids': np.zeros(0, dtype=str),
+    'first_positions': np.zeros((0, 2)),
+    'type_names': np.zeros(0, dtype=str),
+    'frames': np.zeros(0, dtype=np.int64),
+    'objects': np.zeros(0, dtype=np.int32),
+    'boxes': np.zeros((0, 4)),
+    'types': np.zeros(0, dtype=np.int16),
+    'confidences': np.zeros(0, dtype=np.float32),
+}
+
+class TrajectoryWriter:
+    '''
+    Record the bounding box, type and type confidence of every blob at every frame.
+    Every chunk_size rows, the buffered rows are written to the next part file of the directory path + '.parts',
+    along with the objects and types first seen in them, so that only one chunk is kept in memory.
+    save() merges the parts into a compressed npz file at path and removes them.
+    '''
+    def __init__(self, path, chunk_size=10000):
+        self.path = path
+        self.parts_path = path + '.parts'
+        self.chunk_size = chunk_size
+        self.object_ids = {} # blob id -> object index
+        self.type_ids = {None: -1} # type -> type index
+        self.new_object_ids = [] # objects first seen since the last part
+        self.first_positions = []
+        self.num_written_types = 0
+        self.num_parts = 0
+        # parts left by an interrupted run would be merged with the parts of this one
+        shutil.rmtree(self.parts_path, ignore_errors=True)
+        self._reset_rows()
+
+    def _reset_rows(self):
+        self.rows = {'frames': [], 'objects': [], 'boxes': [], 'types': [], 'confidences': []}
+
+    def _flush_rows(self):
+        if not self.rows['frames']:
+            return
+        types = sorted((index, str(_type)) for _type, index in self.type_ids.items() if index >= self.num_written_types)
+        pathlib.Path(self.parts_path).mkdir(parents=True, exist_ok=True)
+        part_path = os.path.join(self.parts_path, '{:06d}.npz'.format(self.num_parts))
+        # parts are complete or missing, even if the process is killed while one is written
+        with open(part_path + '.tmp', 'wb') as part_file:
+            np.savez_compressed(
+                part_file,
+                object_ids=np.array(self.new_object_ids, dtype=str),
+                first_positions=np.array(self.first_positions, dtype=np.float64).reshape(-1, 2),
+                type_names=np.array([name for _, name in types], dtype=str),
+                frames=np.array(self.rows['frames'], dtype=np.int64),
+                objects=np.array(self.rows['objects'], dtype=np.int32),
+                boxes=np.array(self.rows['boxes'], dtype=np.float64).reshape(-1, 4),
+                types=np.array(self.rows['types'], dtype=np.int16),
+                confidences=np.array(self.rows['confidences'], dtype=np.float32),
+            )
+        os.replace(part_path + '.tmp', part_path)
+        self.num_parts += 1
+        self.num_written_types += len(types)
+        self.new_object_ids = []
+        self.first_positions = []
+        self._reset_rows()
+
+    def add(self, frame_number, blobs):
+        '''
+        Record the current state of blobs.
+        '''
+        rows = self.rows
+        for blob_id, blob in blobs.items():
+            obj = self.object_ids.get(blob_id)
+            if obj is None:
+                obj = self.object_ids[blob_id] = len(self.object_ids)
+                self.new_object_ids.append(blob_id)
+                self.first_positions.append(blob.position_first_detected)
+            _type = self.type_ids.get(blob.type)
+            if _type is None:
+                _type = self.type_ids[blob.type] = len(self.type_ids) - 1
+            rows['frames'].append(frame_number)
+            rows['objects'].append(obj)
+            rows['boxes'].append(blob.bounding_box)
+            rows['types'].append(_type)
+            rows['confidences'].append(blob.type_confidence if blob.type_confidence is not None else np.nan)
+        if len(rows['frames']) >= self.chunk_size:
+            self._flush_rows()
+
+    def save(self, **metadata):
+        '''
+        Write trajectories to disk. metadata (video, fps, ...) is stored along with them.
+        '''
+        self._flush_rows()
+        trajectories = _read_parts(self.parts_path)
+        pathlib.Path(os.path.dirname(self.path) or '.').mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(self.path, metadata=np.array(json.dumps(metadata, default=str)), **trajectories)
+        shutil.rmtree(self.parts_path, ignore_errors=True)
+
+def _read_parts(parts_path):
+    '''
+    Concatenate the arrays of the part files written by TrajectoryWriter.
+    '''
+    parts = []
+    for part_path in sorted(glob.glob(os.path.join(parts_path, '*.npz'))):
+        with np.load(part_path) as data:
+            parts.append({name: data[name] for name in data.files})
+    return {name: np.concatenate([empty] + [part[name] for part in parts]) for name, empty in _EMPTY_ARRAYS.items()}
+
+def load_trajectories(path):
+    '''
+    Read a trajectory file written by TrajectoryWriter.
+    path can also be the parts directory of a run that didn't save its trajectories (metadata is then empty).
+    Returns a dict of arrays, metadata is decoded into a dict.
+    '''
+    if os.path.isdir(path):
+        trajectories = _read_parts(path)
+        trajectories['metadata'] = {}
+        return trajectories
+    with np.load(path) as data:
+        trajectories = {name: data[name] for name in data.files}
+    trajectories['metadata'] = json.loads(str(trajectories['metadata']))
+    return trajectories
@@ -0,0 +1,74 @@
+'''
+Long-lived thread pool for per-frame work.
+'''
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class WorkerPool:
+    '''
+    Map a function over a list of items using a persistent pool of threads.
+    Lists shorter than min_parallel_items are processed serially in the calling thread,
+    longer ones are split into one chunk per worker.
+    '''
+    def __init__(self, num_workers, min_parallel_items=8):
+        self.num_workers = max(1, num_workers)
+        self.min_parallel_items = min_parallel_items
+        self.executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix='WorkerPool') \
+                        if self.num_workers > 1 \
+                        else None
+        self.serial_calls = 0
+        self.parallel_calls = 0
+        self.busy_time = 0.0 # total time spent by workers on parallel calls
+        self.wall_time = 0.0 # total elapsed time of parallel calls
+
+    def _run_chunk(self, fn, chunk):
+        start = time.perf_counter()
+        results = [fn(item) for item in chunk]
+        return results, time.perf_counter() - start
+
+    def map(self, fn, items):
+        '''
+        Return [fn(item) for item in items], keeping the order of items.
+        '''
+        items = list(items)
+        if self.executor is None or len(items) < self.min_parallel_items:
+            self.serial_calls += 1
+            return [fn(item) for item in items]
+
+        self.parallel_calls += 1
+        start = time.perf_counter()
+        chunk_size = math.ceil(len(items) / self.num_workers)
+        futures = [
+            self.executor.submit(self._run_chunk, fn, items[i:i + chunk_size])
+            for i in range(0, len(items), chunk_size)
+        ]
+        results = []
+        for future in futures:
+            chunk_results, busy_time = future.result()
+            results.extend(chunk_results)
+            self.busy_time += busy_time
+        self.wall_time += time.perf_counter() - start
+        return results
+
+    def get_stats(self):
+        '''
+        Usage statistics of the pool.
+        utilisation is the fraction of the available worker time spent working during parallel calls.
+        '''
+        utilisation = self.busy_time / (self.wall_time * self.num_workers) if self.wall_time > 0 else 0.0
+        return {
+            'workers': self.num_workers,
+            'serial_calls': self.serial_calls,
+            'parallel_calls': self.parallel_calls,
+            'utilisation': round(utilisation, 3),
+        }
+
+    def shutdown(self):
+        '''
+        Stop the worker threads.
+        '''
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)